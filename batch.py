@@ -0,0 +1,169 @@
+import multiprocessing as mp
+import queue
+import random
+import signal
+import time
+
+from typing import Any, Callable, Dict, List, NamedTuple
+
+from board import BoardPool
+from budget import PuzzleRejected
+from generator import UrjoGenerator
+
+
+class PuzzleResult(NamedTuple):
+    """What a worker sends back for each puzzle, kept small so the queue stays cheap"""
+    url: str
+    contradiction_count: int
+    seconds: float
+    worker: int
+
+
+class Rejection(NamedTuple):
+    """A puzzle a worker gave up on (see budget.py), and why"""
+    reason: str
+    seconds: float
+    worker: int
+
+
+def worker_seeds(seed: int, workers: int) -> List[int]:
+    """Per worker seeds derived from one base seed, so a run can be repeated exactly"""
+    rng = random.Random(seed)
+    return [rng.getrandbits(64) for _ in range(workers)]
+
+
+def worker_quotas(target: int | None, workers: int) -> List[int | None]:
+    """Splits the target between the workers, None means keep going until stopped"""
+    if target is None:
+        return [None] * workers
+    return [target // workers + (1 if i < target % workers else 0) for i in range(workers)]
+
+
+def _take_extra(extra, wanted: int) -> int:
+    """claims up to wanted of the replacement puzzles the parent asked for, returns how many"""
+    with extra.get_lock():
+        taken = min(wanted, extra.value)
+        extra.value -= taken
+    return taken
+
+
+def _worker(worker_id: int, seed: int, quota: int | None, params: Dict[str, Any], per_grid: int, results, stop, extra):
+    """
+    Runs in its own process, generating puzzles until stop is set. With a quota it makes that many first,
+    so the same seed gives the same puzzles, and then only replacements for ones the parent dropped
+    """
+    # the parent decides what ctrl+c means, workers just finish the puzzle they are on
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    random.seed(seed)
+    # one generator for the whole run, its board is reset in place for every puzzle instead of reallocated.
+    # Set up like the server's workers, the pool only comes into it if a run ever changes shape
+    generator = UrjoGenerator(board_pool=BoardPool())
+    made = 0
+    try:
+        while not stop.is_set():
+            if quota is not None and made >= quota:
+                taken = _take_extra(extra, max(per_grid, 1))
+                if not taken:
+                    # done unless the parent drops something, it sets stop once it has its target
+                    stop.wait(0.05)
+                    continue
+                quota += taken
+            start = time.perf_counter()
+            if per_grid <= 1:
+                try:
+                    board = generator.create_puzzle(**params)
+                except PuzzleRejected as rejected:
+                    results.put(Rejection(rejected.reason, time.perf_counter() - start, worker_id))
+                    continue
+                results.put(PuzzleResult(board.to_url_format(), board.contradiction_count,
+                                         time.perf_counter() - start, worker_id))
+                made += 1
+                continue
+
+            # several puzzles out of one solved grid, the time is split evenly between them
+            options = dict(params)
+            generator.create_solved_board(options.pop("dim1"), options.pop("dim2"), options.pop("uniform_grid", False))
+            # doesnt change the puzzles anyway, see create_puzzles_from_grid
+            options.pop("number_of_numbers", None)
+            k = per_grid if quota is None else min(per_grid, quota - made)
+            puzzles = generator.create_puzzles_from_grid(k, **options)
+            seconds = (time.perf_counter() - start) / max(len(puzzles), 1)
+            for url, contradiction_count in puzzles:
+                results.put(PuzzleResult(url, contradiction_count, seconds, worker_id))
+            for rejected in generator.rejections:
+                results.put(Rejection(rejected.reason, seconds, worker_id))
+            made += len(puzzles)
+    finally:
+        # tells the writer this worker is done
+        results.put(worker_id)
+
+
+def generate_batch(params: Dict[str, Any], on_result: Callable[[PuzzleResult], None], workers: int = 1,
+                   target: int | None = None, seed: int = 0, per_grid: int = 1,
+                   on_reject: Callable[[Rejection], None] | None = None) -> int:
+    """
+    Generates puzzles with create_puzzle(**params) in worker processes and hands every result to on_result,
+    which only ever runs in this process so it can be the single writer.
+    per_grid above 1 makes that many puzzles out of every solved grid (see UrjoGenerator.create_puzzles_from_grid).
+    The first ctrl+c stops the workers after their current puzzle and still delivers everything,
+    a second one kills them. Puzzles given up on (deadline, max_steps, ... in params) dont count towards target
+    and go to on_reject instead if it is given. on_result can return False to drop a result (a duplicate, say),
+    it doesnt count either and a worker makes another puzzle in its place. Returns how many results were kept
+    """
+    ctx = mp.get_context()
+    results = ctx.Queue()
+    stop = ctx.Event()
+    # replacements for dropped results that no worker has taken yet
+    extra = ctx.Value("q", 0)
+    if target is not None and target <= 0:
+        stop.set()
+    processes = [
+        ctx.Process(target=_worker, args=(i, worker_seed, quota, params, per_grid, results, stop, extra), daemon=True)
+        for i, (worker_seed, quota) in enumerate(zip(worker_seeds(seed, workers), worker_quotas(target, workers)))
+    ]
+    for process in processes:
+        process.start()
+
+    def on_sigint(signum, frame):
+        if stop.is_set():
+            for process in processes:
+                process.terminate()
+        stop.set()
+
+    previous_handler = signal.signal(signal.SIGINT, on_sigint)
+    delivered = 0
+    running = len(processes)
+    try:
+        while running:
+            try:
+                item = results.get(timeout=0.5)
+            except queue.Empty:
+                # nothing yet, only give up once every worker is gone (killed ones never say they are done)
+                if not any(process.is_alive() for process in processes):
+                    break
+                continue
+            if isinstance(item, int):
+                running -= 1
+                continue
+            if isinstance(item, Rejection):
+                if on_reject is not None:
+                    on_reject(item)
+                continue
+            if on_result(item) is False:
+                with extra.get_lock():
+                    extra.value += 1
+                continue
+            delivered += 1
+            if target is not None and delivered >= target:
+                stop.set()
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        stop.set()
+        if running:
+            # left early (on_result raised, say a full disk), nobody reads the queue anymore so a worker
+            # could block forever flushing into it, and with no target it would never stop on its own
+            for process in processes:
+                process.terminate()
+        for process in processes:
+            process.join()
+    return delivered
@@ -0,0 +1,95 @@
+import argparse
+import random
+import statistics
+import time
+
+from generator import UrjoGenerator
+
+
+def bench_fill(sizes, repeats: int, seed: int):
+    """Times create_full_board (cells plus fill_board_backtracking) for square boards of each size"""
+    print(f"{'size':>7} {'median s':>10} {'max s':>10}")
+    for size in sizes:
+        times = []
+        for i in range(repeats):
+            random.seed(seed + i)
+            generator = UrjoGenerator()
+            start = time.perf_counter()
+            generator.create_full_board(size, size)
+            times.append(time.perf_counter() - start)
+        print(f"{f'{size}x{size}':>7} {statistics.median(times):>10.4f} {max(times):>10.4f}")
+
+
+def bench_schedule(width: int, height: int, depth: int, numbers: int, puzzles: int, seed: int, bitboard=False):
+    """Times create_puzzle with the single pass and the tiered schedule on the same solved grids"""
+    print(f"{'schedule':>9} {'median s':>10} {'total s':>10} {'hidden':>8} {'contradictions':>15}")
+    for schedule in ("single", "tiered"):
+        times = []
+        hidden = 0
+        contradictions = 0
+        generator = UrjoGenerator()
+        for i in range(puzzles):
+            random.seed(seed + i)
+            start = time.perf_counter()
+            board = generator.create_puzzle(width, height, number_of_numbers=numbers, contradiction_count=depth,
+                                            bitboard=bitboard, schedule=schedule)
+            times.append(time.perf_counter() - start)
+            hidden += sum(square.hidden for square in board.all_squares)
+            contradictions += board.contradiction_count
+        print(f"{schedule:>9} {statistics.median(times):>10.4f} {sum(times):>10.4f} "
+              f"{hidden / puzzles:>8.1f} {contradictions / puzzles:>15.1f}")
+
+
+def bench_parallel(size: int, depth: int, workers, puzzles: int, seed: int):
+    """Times one big puzzle at a time on the bitboard kernel with each number of search_workers"""
+    print(f"{'workers':>8} {'median s':>10} {'total s':>10}")
+    urls = None
+    for count in workers:
+        times = []
+        made = []
+        generator = UrjoGenerator()
+        for i in range(puzzles):
+            random.seed(seed + i)
+            start = time.perf_counter()
+            board = generator.create_puzzle(size, size, contradiction_count=depth, bitboard=True, search_workers=count)
+            times.append(time.perf_counter() - start)
+            made.append(board.to_url_format())
+        generator.close()
+        if urls is not None and made != urls:
+            print("  puzzles differ from the first run!")
+        urls = made
+        print(f"{count:>8} {statistics.median(times):>10.4f} {sum(times):>10.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Timing benchmarks for the generator")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fill = commands.add_parser("fill", help="solution grid fill time against board size")
+    fill.add_argument("--sizes", type=int, nargs="+", default=[8, 16, 24, 32, 40, 50, 64])
+    fill.add_argument("--repeats", type=int, default=5)
+    fill.add_argument("--seed", type=int, default=0)
+
+    schedule = commands.add_parser("schedule", help="single pass against tiered uncoloring")
+    schedule.add_argument("--width", type=int, default=8)
+    schedule.add_argument("--height", type=int, default=8)
+    schedule.add_argument("--contradictions", type=int, default=2)
+    schedule.add_argument("--numbers", type=int, default=5)
+    schedule.add_argument("--puzzles", type=int, default=10)
+    schedule.add_argument("--seed", type=int, default=0)
+    schedule.add_argument("--bitboard", action="store_true")
+
+    parallel = commands.add_parser("parallel", help="single puzzle latency against search_workers")
+    parallel.add_argument("--size", type=int, default=15)
+    parallel.add_argument("--contradictions", type=int, default=1)
+    parallel.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parallel.add_argument("--puzzles", type=int, default=3)
+    parallel.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    if args.command == "fill":
+        bench_fill(args.sizes, args.repeats, args.seed)
+    elif args.command == "schedule":
+        bench_schedule(args.width, args.height, args.contradictions, args.numbers, args.puzzles, args.seed, args.bitboard)
+    elif args.command == "parallel":
+        bench_parallel(args.size, args.contradictions, args.workers, args.puzzles, args.seed)
@@ -0,0 +1,569 @@
+import math
+import random
+
+from collections import deque
+from typing import Dict, List, Tuple
+
+from board import Board, neighbour_table, url_values, values_url
+from cell import RED, BLUE
+from lines import solve_line
+from ordering import CandidateOrder, random_order
+from budget import Budget
+from transposition import TranspositionCache
+
+
+# per shape (rows, cols), built once like board.neighbour_table since every bitboard of a shape shares them
+_neighbour_masks: Dict[Tuple[int, int], Tuple[Tuple[Tuple[int, int], ...], ...]] = {}
+_neighbour_totals: Dict[Tuple[int, int], List[int]] = {}
+
+
+def neighbour_masks(rows: int, cols: int) -> Tuple[Tuple[Tuple[int, int], ...], ...]:
+    """For every cell index the (row, mask) pairs covering its neighbours"""
+    masks = _neighbour_masks.get((rows, cols))
+    if masks is None:
+        full_row = (1 << cols) - 1
+        built = []
+        for y in range(rows):
+            for x in range(cols):
+                # shifting 0b111 gives the three columns around x, clipped to the board
+                band = ((7 << x) >> 1) & full_row
+                built.append(tuple(
+                    (yy, band & ~(1 << x) if yy == y else band) for yy in (y - 1, y, y + 1) if 0 <= yy < rows))
+        masks = tuple(built)
+        _neighbour_masks[(rows, cols)] = masks
+    return masks
+
+
+def neighbour_totals(rows: int, cols: int) -> List[int]:
+    """how many neighbours each cell index has, shared so dont write to it"""
+    totals = _neighbour_totals.get((rows, cols))
+    if totals is None:
+        totals = [len(n) for n in neighbour_table(rows, cols)]
+        _neighbour_totals[(rows, cols)] = totals
+    return totals
+
+
+class BitBoard():
+    """
+    The Urjo puzzle stored as integer bitmasks instead of Cell objects, bit x of a row mask is the cell in column x.
+    It mirrors the object model exactly (red is kept for hidden cells too, just like Cell.color) so the
+    same random seed generates the same puzzle as the Board path does
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.row_max = math.ceil(width / 2)
+        self.column_max = math.ceil(height / 2)
+
+        # visible cells and red cells per row
+        self.known: List[int] = [0] * height
+        self.red: List[int] = [0] * height
+        # the same bits transposed so column counts are a popcount too
+        self.column_known: List[int] = [0] * width
+        self.column_red: List[int] = [0] * width
+
+        # visible number per cell index (y * width + x), None if there isnt one
+        self.numbers: List[int | None] = [None] * (width * height)
+        # cell indices in the order candidates are sampled, mirrors Board.all_squares
+        self.order: List[int] = list(range(width * height))
+
+        # undo log of (index, old known bit, old red bit)
+        self.trail: List[Tuple[int, int, int]] = []
+        self.contradiction_count = 0
+        # where the contradiction search samples from, and an optional cache of inner can_be_color results
+        self.random = random.Random()
+        self.cache: TranspositionCache | None = None
+        self.candidate_order: CandidateOrder = random_order
+        self.budget: Budget | None = None
+        # a parallel.CandidatePool to fan the top level candidates out to, None searches them here
+        self.pool = None
+
+        # same neighbour order as the object model, shared with every board of this shape
+        self.neighbours = neighbour_table(height, width)
+        self.neighbour_total: List[int] = neighbour_totals(height, width)
+        self.neighbour_masks: Tuple[Tuple[Tuple[int, int], ...], ...] = neighbour_masks(height, width)
+
+    @classmethod
+    def from_board(cls, board: Board):
+        """converts a fully colored Board into a bitboard, keeping its all_squares order"""
+        width = len(board.columns)
+        height = len(board.rows)
+        bitboard = cls(width, height)
+        for y, row in enumerate(board.rows):
+            for x, sq in enumerate(row.get_cells()):
+                if sq.color is None:
+                    raise ValueError("BitBoard can only hold a fully colored board")
+                bitboard._set_bits(y * width + x, not sq.hidden, sq.color == RED)
+                bitboard.numbers[y * width + x] = sq.get_number()
+        bitboard.order = [sq.posX * width + sq.posY for sq in board.all_squares]
+        bitboard.contradiction_count = board.contradiction_count
+        return bitboard
+
+    @classmethod
+    def from_url(cls, url_str: str, dim1: int, dim2: int):
+        """converts a url into a bitboard"""
+        if len(url_str) != dim1 * dim2:
+            raise ValueError("URL length does not match provided dimensions")
+        return cls.from_values(url_values(url_str), dim1, dim2)
+
+    @classmethod
+    def from_values(cls, values: bytes, dim1: int, dim2: int):
+        """from_url on values already decoded with board.url_values"""
+        bitboard = cls(dim1, dim2)
+        for idx, value in enumerate(values):
+            bitboard._set_bits(idx, value & 1, (value >> 1) & 1)
+            num_val = value >> 2
+            bitboard.numbers[idx] = num_val - 1 if num_val > 0 else None
+        return bitboard
+
+    def to_url_format(self):
+        """Sends the current puzzle into a url format, identical to Board.to_url_format"""
+        return values_url(self.cell_values())
+
+    def cell_values(self) -> bytearray:
+        """The url value of every cell row by row, see board.url_values"""
+        values = bytearray()
+        for y in range(self.height):
+            known = self.known[y]
+            red = self.red[y]
+            for x in range(self.width):
+                number = self.numbers[y * self.width + x]
+                num_val = 0 if number is None else number + 1
+                if num_val > 15 or num_val < 0:
+                    raise ValueError(f"Invalid number {num_val} received")
+                values.append((num_val << 2) | ((red >> x & 1) << 1) | (known >> x & 1))
+        return values
+
+    def to_board(self) -> Board:
+        """converts the bitboard back into the object model"""
+        board = Board.from_url(self.to_url_format(), self.width, self.height)
+        board.contradiction_count = self.contradiction_count
+        return board
+
+    def apply_to(self, board: Board):
+        """writes the colors, hidden flags and contradiction count back onto the Board this came from"""
+        for y, row in enumerate(board.rows):
+            known = self.known[y]
+            red = self.red[y]
+            for x, sq in enumerate(row.get_cells()):
+                sq.write(RED if red >> x & 1 else BLUE, not known >> x & 1)
+        board.contradiction_count = self.contradiction_count
+
+    def state(self) -> Tuple[Tuple[int, ...], Tuple[int, ...]]:
+        """the row masks (known, red), all load_state needs to put this position on another bitboard of the same numbers"""
+        return tuple(self.known), tuple(self.red)
+
+    def load_state(self, known: Tuple[int, ...], red: Tuple[int, ...]):
+        """replaces the position with one from state(), rebuilding the column masks and clearing the trail"""
+        self.known = list(known)
+        self.red = list(red)
+        self.column_known = [0] * self.width
+        self.column_red = [0] * self.width
+        for y in range(self.height):
+            column_bit = 1 << y
+            for x in range(self.width):
+                if known[y] >> x & 1:
+                    self.column_known[x] |= column_bit
+                if red[y] >> x & 1:
+                    self.column_red[x] |= column_bit
+        self.trail = []
+
+    def _set_bits(self, index: int, known, red):
+        """sets the known and red bit of a cell in both the row and column masks"""
+        y, x = divmod(index, self.width)
+        bit = 1 << x
+        column_bit = 1 << y
+        if known:
+            self.known[y] |= bit
+            self.column_known[x] |= column_bit
+        else:
+            self.known[y] &= ~bit
+            self.column_known[x] &= ~column_bit
+        if red:
+            self.red[y] |= bit
+            self.column_red[x] |= column_bit
+        else:
+            self.red[y] &= ~bit
+            self.column_red[x] &= ~column_bit
+
+    def set_color(self, index: int, red, visible=True):
+        """Sets a cells color and visibility, pushing the old bits onto the trail"""
+        y, x = divmod(index, self.width)
+        self.trail.append((index, self.known[y] >> x & 1, self.red[y] >> x & 1))
+        self._set_bits(index, visible, red)
+
+    def undo_to(self, mark: int):
+        """Undoes every write made since the mark (len(trail)) was taken"""
+        trail = self.trail
+        while len(trail) > mark:
+            index, known, red = trail.pop()
+            self._set_bits(index, known, red)
+
+    def is_known(self, index: int):
+        y, x = divmod(index, self.width)
+        return self.known[y] >> x & 1
+
+    def row_counts(self, y: int):
+        """red and blue visible in a row"""
+        known = self.known[y]
+        red = (known & self.red[y]).bit_count()
+        return red, known.bit_count() - red
+
+    def column_counts(self, x: int):
+        """red and blue visible in a column"""
+        known = self.column_known[x]
+        red = (known & self.column_red[x]).bit_count()
+        return red, known.bit_count() - red
+
+    def neighbour_counts(self, index: int):
+        """red, blue and uncolored cells around a cell"""
+        red = blue = 0
+        for y, mask in self.neighbour_masks[index]:
+            known = self.known[y] & mask
+            r = (known & self.red[y]).bit_count()
+            red += r
+            blue += known.bit_count() - r
+        return red, blue, self.neighbour_total[index] - red - blue
+
+    def check_row_and_column(self, index: int):
+        """makes sure the row and column of a cell dont have too many of a color"""
+        y, x = divmod(index, self.width)
+        red, blue = self.row_counts(y)
+        if red > self.row_max or blue > self.row_max:
+            return False
+        red, blue = self.column_counts(x)
+        if red > self.column_max or blue > self.column_max:
+            return False
+        return True
+
+    def fill_row(self, y: int) -> List[int]:
+        """Fills a row with the other color once one color is half full, same as Board.fill_half_full_row"""
+        red, blue = self.row_counts(y)
+        if red == self.row_max:
+            fill_red = False
+        elif blue == self.row_max:
+            fill_red = True
+        else:
+            return []
+        unknown = ~self.known[y] & ((1 << self.width) - 1)
+        changed = []
+        base = y * self.width
+        while unknown:
+            low = unknown & -unknown
+            index = base + low.bit_length() - 1
+            self.set_color(index, fill_red)
+            changed.append(index)
+            unknown ^= low
+        return changed
+
+    def fill_column(self, x: int) -> List[int]:
+        """Fills a column with the other color once one color is half full, same as Board.fill_half_full_column"""
+        red, blue = self.column_counts(x)
+        if red == self.column_max:
+            fill_red = False
+        elif blue == self.column_max:
+            fill_red = True
+        else:
+            return []
+        unknown = ~self.column_known[x] & ((1 << self.height) - 1)
+        changed = []
+        while unknown:
+            low = unknown & -unknown
+            index = (low.bit_length() - 1) * self.width + x
+            self.set_color(index, fill_red)
+            changed.append(index)
+            unknown ^= low
+        return changed
+
+    def check_and_fill_row(self, y: int) -> List[int] | None:
+        """Fills the rest of the row once a color is half full like fill_row, None if a color is already past half"""
+        known = self.known[y]
+        solved = solve_line(self.width, known, self.red[y])
+        if solved is None:
+            return None
+        new_known, new_red = solved
+        forced = new_known & ~known
+        changed = []
+        base = y * self.width
+        while forced:
+            low = forced & -forced
+            index = base + low.bit_length() - 1
+            self.set_color(index, new_red & low)
+            changed.append(index)
+            forced ^= low
+        return changed
+
+    def check_and_fill_column(self, x: int) -> List[int] | None:
+        """Fills the rest of the column once a color is half full like fill_column, None if a color is already past half"""
+        known = self.column_known[x]
+        solved = solve_line(self.height, known, self.column_red[x])
+        if solved is None:
+            return None
+        new_known, new_red = solved
+        forced = new_known & ~known
+        changed = []
+        while forced:
+            low = forced & -forced
+            index = (low.bit_length() - 1) * self.width + x
+            self.set_color(index, new_red & low)
+            changed.append(index)
+            forced ^= low
+        return changed
+
+    def number_check(self, index: int, counts: Tuple[int, int, int] | None = None):
+        """Checks if the number rule is violated, same as UrjoGenerator.number_check. counts saves redoing neighbour_counts"""
+        number = self.numbers[index]
+        if number is None:
+            return True
+        red, blue, uncolored = counts if counts is not None else self.neighbour_counts(index)
+        total = self.neighbour_total[index]
+        if number < 0 or number > total:
+            return False
+
+        def feasible(same_count, opp_count):
+            if same_count > number or same_count + uncolored < number:
+                return False
+            if opp_count > total - number or opp_count + uncolored < total - number:
+                return False
+            return True
+
+        y, x = divmod(index, self.width)
+        if self.known[y] >> x & 1:
+            if self.red[y] >> x & 1:
+                return feasible(red, blue)
+            return feasible(blue, red)
+        return feasible(blue, red) or feasible(red, blue)
+
+    def check_surrounding_numbers(self, index: int):
+        """Check whether every surrounding numbered cell's checks pass"""
+        for neighbour in self.neighbours[index]:
+            if not self.number_check(neighbour):
+                return False
+        return True
+
+    def try_to_fill(self, index: int, counts: Tuple[int, int, int] | None = None) -> List[int]:
+        """
+        Fills the number cell and/or its surrounding cells, same rules as Board.tryToFill.
+        Returns the indices it wrote to, empty if nothing changed. counts saves redoing neighbour_counts
+        """
+        number = self.numbers[index]
+        if number is None:
+            return []
+        red, blue, uncolored = counts if counts is not None else self.neighbour_counts(index)
+        total = self.neighbour_total[index]
+        if number < 0 or number > total:
+            return []
+
+        required_same = number
+        required_opp = total - number
+        changed = []
+
+        def feasible(same_count, opp_count):
+            if same_count > required_same or same_count + uncolored < required_same:
+                return False
+            if opp_count > required_opp or opp_count + uncolored < required_opp:
+                return False
+            return True
+
+        y, x = divmod(index, self.width)
+        if self.known[y] >> x & 1:
+            is_red = self.red[y] >> x & 1
+        else:
+            can_be_red = feasible(red, blue)
+            can_be_blue = feasible(blue, red)
+            if can_be_red != can_be_blue:
+                self.set_color(index, can_be_red)
+                changed.append(index)
+                is_red = can_be_red
+            elif not can_be_red:
+                return []
+            else:
+                return changed
+
+        if uncolored == 0:
+            return changed
+
+        if is_red:
+            same_count, opp_count = red, blue
+        else:
+            same_count, opp_count = blue, red
+
+        # same meets target (unassigned must be opposite)
+        if same_count == required_same:
+            fill_red, visible = not is_red, True
+        # opposite meets target (unassigned must be same)
+        elif opp_count == required_opp:
+            fill_red, visible = is_red, True
+        # all unassigned required to be the same
+        elif same_count + uncolored == required_same:
+            fill_red, visible = is_red, True
+        # all unassigned opposite color, Board.tryToFill leaves these hidden so this does as well
+        elif opp_count + uncolored == required_opp:
+            fill_red, visible = not is_red, False
+        else:
+            return changed
+
+        for neighbour in self.neighbours[index]:
+            if not self.is_known(neighbour):
+                self.set_color(neighbour, fill_red, visible)
+                changed.append(neighbour)
+        return changed
+
+    def candidate_slack(self, index: int) -> int:
+        """Same as UrjoGenerator.candidate_slack"""
+        y, x = divmod(index, self.width)
+        slack = min(self.row_max - max(self.row_counts(y)), self.column_max - max(self.column_counts(x)))
+        numbers = self.numbers
+        for neighbour in self.neighbours[index]:
+            number = numbers[neighbour]
+            if number is None:
+                continue
+            red, blue, _ = self.neighbour_counts(neighbour)
+            opp_total = self.neighbour_total[neighbour] - number
+            ny, nx = divmod(neighbour, self.width)
+            if self.known[ny] >> nx & 1:
+                counts = ((red, blue),) if self.red[ny] >> nx & 1 else ((blue, red),)
+            else:
+                counts = ((red, blue), (blue, red))
+            for same_count, opp_count in counts:
+                same, opp = number - same_count, opp_total - opp_count
+                if same >= 0 and opp >= 0:
+                    slack = min(slack, same, opp)
+        return slack
+
+    def can_be_color(self, index: int, red, number_checks=True, row_checks=True,
+                     contradiction_count=1, original_contradiction=1, max_steps_without_info=4, line_checks=False):
+        """Same search as UrjoGenerator.can_be_color without identical checks, red is the color being tried"""
+        cache = self.cache
+        if cache is None or contradiction_count == original_contradiction or self.width * self.height > 10000:
+            return self._can_be_color(index, red, number_checks, row_checks,
+                                      contradiction_count, original_contradiction, max_steps_without_info, line_checks)
+
+        # the masks are small enough to be the key themselves, so unlike the Board path there are no hash collisions
+        known = self.known
+        key = (tuple(known), tuple(k & r for k, r in zip(known, self.red)), index, bool(red),
+               contradiction_count, original_contradiction, max_steps_without_info, number_checks, row_checks, line_checks)
+        result = cache.get(key)
+        if result is None:
+            result = self._can_be_color(index, red, number_checks, row_checks,
+                                        contradiction_count, original_contradiction, max_steps_without_info, line_checks)
+            cache.put(key, result)
+        return result
+
+    def _can_be_color(self, index: int, red, number_checks=True, row_checks=True,
+                      contradiction_count=1, original_contradiction=1, max_steps_without_info=4, line_checks=False):
+        if self.budget is not None:
+            self.budget.step()
+        mark = len(self.trail)
+        self.set_color(index, red)
+
+        width = self.width
+        neighbours = self.neighbours
+        numbers = self.numbers
+
+        queue = deque([index])
+        queued = {index}
+        processed = set()
+        processed_numbers = set()
+
+        while queue:
+            current = queue.popleft()
+            queued.discard(current)
+            processed.add(current)
+            if row_checks:
+                y, x = divmod(current, width)
+                if line_checks:
+                    row_changed = self.check_and_fill_row(y)
+                    col_changed = self.check_and_fill_column(x) if row_changed is not None else None
+                    if row_changed is None or col_changed is None:
+                        self.undo_to(mark)
+                        return False
+                else:
+                    row_changed = self.fill_row(y)
+                    col_changed = self.fill_column(x)
+                for ch in row_changed:
+                    if ch not in processed and ch not in queued:
+                        queue.append(ch)
+                        queued.add(ch)
+                for ch in col_changed:
+                    if ch not in processed and ch not in queued:
+                        queue.append(ch)
+                        queued.add(ch)
+
+            if number_checks:
+                for neighbour in neighbours[current]:
+                    if numbers[neighbour] is None or neighbour in processed_numbers:
+                        continue
+                    processed_numbers.add(neighbour)
+                    for f in self.try_to_fill(neighbour):
+                        if f not in processed and f not in queued:
+                            queue.append(f)
+                            queued.add(f)
+
+        did_expansion = len(processed) > 1
+
+        if (number_checks and not self.check_surrounding_numbers(index)) or \
+                (row_checks and not self.check_row_and_column(index)):
+            self.undo_to(mark)
+            return False
+
+        should_continue = did_expansion or (
+            contradiction_count + max_steps_without_info > original_contradiction)
+
+        if contradiction_count > 0 and should_continue:
+            known = self.known
+            change_available = [i for i in self.order if not known[i // width] >> (i % width) & 1]
+            near_cells = {n for p in processed for n in neighbours[p]}
+            near_rows = {p // width for p in processed}
+            near_columns = {p % width for p in processed}
+
+            def score(i: int):
+                near = i in near_cells or i // width in near_rows or i % width in near_columns
+                return self.candidate_slack(i), not near
+
+            samples = self.candidate_order(change_available, self.random, score)
+            pool = self.pool
+            if pool is not None and contradiction_count == original_contradiction and len(samples) >= pool.min_candidates:
+                found = pool.first_contradiction(self, samples, contradiction_count - 1, original_contradiction,
+                                                 number_checks, row_checks, line_checks, self.budget)
+            else:
+                found = self.first_contradiction(samples, contradiction_count - 1, original_contradiction,
+                                                 number_checks, row_checks, line_checks) is not None
+            if found:
+                if contradiction_count == original_contradiction:
+                    self.contradiction_count += 1
+                self.undo_to(mark)
+                return False
+
+        self.undo_to(mark)
+        return True
+
+    def first_contradiction(self, candidates: List[int], contradiction_count: int, original_contradiction: int,
+                            number_checks=True, row_checks=True, line_checks=False, stop=None) -> int | None:
+        """
+        The first candidate that can be neither color, None if every one can be one of them.
+        stop is checked before each candidate and gives up (returning None) once it says so
+        """
+        for candidate in candidates:
+            if stop is not None and stop():
+                return None
+            # a cell that can be blue cant be a contradiction, so red is only tried when blue fails
+            if self.can_be_color(candidate, False, number_checks, row_checks,
+                                 contradiction_count, original_contradiction, line_checks=line_checks):
+                continue
+            if not self.can_be_color(candidate, True, number_checks, row_checks,
+                                     contradiction_count, original_contradiction, line_checks=line_checks):
+                return candidate
+        return None
+
+    def uncolor_square(self, index: int, number_checks=True, row_checks=True, contradiction_count=1, max_steps_without_info=4,
+                       line_checks=False):
+        """Hides a cell if the opposite color can be ruled out, same as UrjoGenerator.uncolor_square"""
+        y, x = divmod(index, self.width)
+        if self.can_be_color(index, not self.red[y] >> x & 1, number_checks, row_checks, contradiction_count,
+                             original_contradiction=contradiction_count, max_steps_without_info=max_steps_without_info,
+                             line_checks=line_checks):
+            return False
+        self._set_bits(index, False, self.red[y] >> x & 1)
+        return True
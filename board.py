@@ -1,12 +1,89 @@
 import random
 
-from typing import List, Tuple
+from typing import Dict, List, Literal, Tuple
 
 from lines import *
 from cell import *
 
+# neighbour indices per cell, shared by every board with the same shape
+_neighbour_tables: Dict[Tuple[int, int], Tuple[Tuple[int, ...], ...]] = {}
+
+def neighbour_table(rows: int, cols: int) -> Tuple[Tuple[int, ...], ...]:
+    """For every cell index (row * cols + column) the indices of its valid neighbours, in the same order get_surrounding_slots used to return them"""
+    table = _neighbour_tables.get((rows, cols))
+    if table is None:
+        built = []
+        for r in range(rows):
+            for c in range(cols):
+                built.append(tuple(rr * cols + cc
+                                   for rr in (r - 1, r, r + 1) for cc in (c - 1, c, c + 1)
+                                   if (rr != r or cc != c) and 0 <= rr < rows and 0 <= cc < cols))
+        table = tuple(built)
+        _neighbour_tables[(rows, cols)] = table
+    return table
+
+# random (red key, blue key) per cell for hashing the visible board, fixed per shape so hashes are reproducible
+_zobrist_tables: Dict[Tuple[int, int], Tuple[Tuple[int, int], ...]] = {}
+
+def zobrist_table(rows: int, cols: int) -> Tuple[Tuple[int, int], ...]:
+    """For every cell index a (red key, blue key) pair, the board hash is the xor of the keys of every visible color"""
+    table = _zobrist_tables.get((rows, cols))
+    if table is None:
+        # its own generator so building a table never moves the global random state
+        rng = random.Random(f"zobrist {rows}x{cols}")
+        table = tuple((rng.getrandbits(64), rng.getrandbits(64)) for _ in range(rows * cols))
+        _zobrist_tables[(rows, cols)] = table
+    return table
+
+# one character per cell, its value is (shown number + 1) << 2 | color << 1 | visible
+URL_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+# for bytes.translate, url character -> cell value with 255 for anything not in the alphabet, and cell value -> character
+URL_DECODE = bytes(URL_ALPHABET.find(chr(c)) if chr(c) in URL_ALPHABET else 255 for c in range(256))
+URL_ENCODE = bytes(ord(URL_ALPHABET[v]) if v < len(URL_ALPHABET) else 0 for v in range(256))
+
+def url_values(url_str: str) -> bytes:
+    """The cell values of a url, row by row, one byte each"""
+    try:
+        values = url_str.encode("ascii").translate(URL_DECODE)
+    except UnicodeEncodeError:
+        values = b"\xff"
+    if 255 in values:
+        raise ValueError(f"Invalid character in url {url_str!r}")
+    return values
+
+def values_url(values: bytes | bytearray) -> str:
+    """url_values backwards"""
+    if values and max(values) >= len(URL_ALPHABET):
+        raise ValueError(f"Cell value {max(values)} has no url character")
+    return values.translate(URL_ENCODE).decode("ascii")
+
+class BoardPool():
+    """Keeps released boards per shape so they can be handed out again instead of allocating new cells every time"""
+
+    def __init__(self, max_per_shape: int = 8):
+        self.max_per_shape = max_per_shape
+        self.free: Dict[Tuple[int, int], List["Board"]] = {}
+
+    def acquire(self, dim1: int, dim2: int) -> "Board":
+        """An empty board of this shape, reused if one was released"""
+        free = self.free.get((dim1, dim2))
+        if free:
+            board = free.pop()
+            board.reset()
+            return board
+        board = Board()
+        board.build(dim1, dim2)
+        return board
+
+    def release(self, board: "Board"):
+        """Gives a board back, nothing else should hold on to it after this"""
+        free = self.free.setdefault(board.shape(), [])
+        if len(free) < self.max_per_shape:
+            free.append(board)
+
 class Board():
     """The Urjo puzzle, made up of rows and columns"""
+    __slots__ = ("rows", "columns", "all_numbers", "all_squares", "contradiction_count", "removed_by_identical", "trail", "zobrist")
 
     def __init__(self, rows: List[UrjoRow] = [], columns: list[UrjoColumn] = []):
         self.rows = rows
@@ -16,6 +93,10 @@ class Board():
         self.all_squares: List[Cell] = []
         self.contradiction_count = 0
         self.removed_by_identical = 0
+        # undo log of (cell, old color, old hidden), pushed by Cell.set_color and popped by undo_to
+        self.trail: List[Tuple[Cell, Color | None, bool]] = []
+        # zobrist hash of the visible colors, kept up to date by Cell.write
+        self.zobrist = 0
 
     def __str__(self):
         """how a puzzle prints out, for testing purposes"""
@@ -23,10 +104,9 @@ class Board():
         for row in self.rows:
             line = []
             for square in row.cells:
-                if square.color == "blue":
-                    line.append("b")
-                elif square.color == "red":
-                    line.append("r")
+                if square.color == BLUE or square.color == RED:
+                    # first letter of the color's name
+                    line.append(COLOR_NAMES[square.color][0])
                 elif square.get_color() is None:
                     line.append(".")
                 else:
@@ -35,39 +115,23 @@ class Board():
         return "\n".join(lines)
 
     @classmethod
-    def from_url(cls, url_str: str, dim1: int, dim2: int):
-        """converts a url into a urjo puzzle"""
-        alphabet = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    def from_url(cls, url_str: str, dim1: int, dim2: int, board: "Board | None" = None):
+        """converts a url into a urjo puzzle, decoding into board (say one from a BoardPool) instead of a new one if given"""
         if len(url_str) != dim1 * dim2:
             raise ValueError("URL length does not match provided dimensions")
+        return cls.from_values(url_values(url_str), dim1, dim2, board)
 
-        board = cls()
-        board.rows = [UrjoRow([]) for _ in range(dim2)]
-        board.columns = [UrjoColumn([]) for _ in range(dim1)]
-        board.all_squares = []
-        board.all_numbers = []
-
-        for y in range(dim2):
-            for x in range(dim1):
-                new_square = Cell(board, None, y, x)
-                new_square.row = board.rows[y]
-                new_square.column = board.columns[x]
-                board.rows[y].cells.append(new_square)
-                board.columns[x].cells.append(new_square)
-                board.all_squares.append(new_square)
-
-        for idx, ch in enumerate(url_str):
-            value = alphabet.index(ch)
-            visible_bit = value & 1
-            color_bit = (value >> 1) & 1
-            num_val = value >> 2
-
-            sq = board.all_squares[idx]
-
-            sq.color = "blue" if color_bit == 0 else "red"
+    @classmethod
+    def from_values(cls, values: bytes, dim1: int, dim2: int, board: "Board | None" = None):
+        """from_url on values already decoded with url_values"""
+        if board is None:
+            board = cls()
+        board.reuse(dim1, dim2)
 
-            sq.hidden = (visible_bit == 0)
+        for sq, value in zip(board.all_squares, values):
+            sq.write(value >> 1 & 1, not value & 1)
 
+            num_val = value >> 2
             if num_val > 0:
                 sq.number = num_val - 1
                 sq.number_hidden = False
@@ -75,16 +139,66 @@ class Board():
                 sq.number = None
                 sq.number_hidden = True
 
-        for row in board.rows:
-            row.set_allowed_size()
-        for col in board.columns:
-            col.set_allowed_size()
-
         board.all_numbers = [
             sq for sq in board.all_squares if sq.number is not None]
 
         return board
 
+    def shape(self) -> Tuple[int, int]:
+        """(dim1, dim2), the width and height"""
+        return len(self.columns), len(self.rows)
+
+    def build(self, dim1: int, dim2: int):
+        """Makes new rows, columns and empty cells for a dim1 wide and dim2 tall board"""
+        self.rows = [UrjoRow([]) for _ in range(dim2)]
+        self.columns = [UrjoColumn([]) for _ in range(dim1)]
+        self.all_squares = []
+        self.all_numbers = []
+
+        for y in range(dim2):
+            for x in range(dim1):
+                new_square = Cell(self, None, y, x)
+                new_square.row = self.rows[y]
+                new_square.column = self.columns[x]
+                self.rows[y].cells.append(new_square)
+                self.columns[x].cells.append(new_square)
+                self.all_squares.append(new_square)
+
+        for row in self.rows:
+            row.set_allowed_size()
+        for col in self.columns:
+            col.set_allowed_size()
+        self.link_neighbours()
+        self.trail.clear()
+        self.contradiction_count = 0
+        self.removed_by_identical = 0
+
+    def reset(self):
+        """
+        Clears every color, hidden flag and number in place so the same cells can be used for the next puzzle or decode.
+        Afterwards the board is the same as a freshly built one of its shape, all_squares is back in reading order too
+        """
+        self.all_squares = [sq for row in self.rows for sq in row.get_cells()]
+        self.all_numbers = []
+        for sq in self.all_squares:
+            sq.reset()
+        for line in self.rows + self.columns:
+            line.red_count = 0
+            line.blue_count = 0
+            line.known_mask = 0
+            line.red_mask = 0
+        self.trail.clear()
+        self.zobrist = 0
+        self.contradiction_count = 0
+        self.removed_by_identical = 0
+
+    def reuse(self, dim1: int, dim2: int):
+        """Resets the board if it already has this shape, else builds it, either way it ends up empty"""
+        if self.rows and self.shape() == (dim1, dim2):
+            self.reset()
+        else:
+            self.build(dim1, dim2)
+
     def snapshot_state(self):
         """Stores the current board to revert to later"""
         snap: list[tuple[Cell, Color | None, bool]] = []
@@ -96,44 +210,51 @@ class Board():
     def restore_state(self, snapshot: list[tuple[Cell, Color | None, bool]]):
         """Reverts to the saved board"""
         for sq, col, hidden in snapshot:
-            sq.color = col
-            sq.hidden = hidden
+            sq.write(col, hidden)
+
+    def trail_mark(self) -> int:
+        """Returns a mark for the current trail position, pass it to undo_to to go back to this point"""
+        return len(self.trail)
+
+    def undo_to(self, mark: int):
+        """Undoes every color/hidden write made since the mark was taken"""
+        trail = self.trail
+        while len(trail) > mark:
+            sq, col, hidden = trail.pop()
+            sq.write(col, hidden)
+
+    def link_neighbours(self):
+        """Gives every cell its neighbouring cells and hash keys from the shared per shape tables, call after the cells are made"""
+        squares = [sq for row in self.rows for sq in row.get_cells()]
+        table = neighbour_table(len(self.rows), len(self.columns))
+        keys = zobrist_table(len(self.rows), len(self.columns))
+        for sq, indices, (red_key, blue_key) in zip(squares, table, keys):
+            sq.neighbours = tuple(squares[i] for i in indices)
+            sq.neighbour_count = len(indices)
+            sq.zobrist_red = red_key
+            sq.zobrist_blue = blue_key
+        self.zobrist = 0
+        for sq in squares:
+            colors = [n.get_color() for n in sq.neighbours]
+            sq.around_red = colors.count(RED)
+            sq.around_blue = colors.count(BLUE)
+            color = sq.get_color()
+            if color == RED:
+                self.zobrist ^= sq.zobrist_red
+            elif color == BLUE:
+                self.zobrist ^= sq.zobrist_blue
 
     def get_surrounding_slots(self, square: Cell):
-        """Returns the surrounding slots around a square"""
-        r = square.posX
-        c = square.posY
-        rows = len(self.rows)
-        cols = len(self.columns)
-
-        def at(rr: int, cc: int):
-            # return the cell at (rr,cc) if it exists, otherwise None.
-            if 0 <= rr < rows and 0 <= cc < cols:
-                row_list = self.rows[rr].get_cells()
-                if 0 <= cc < len(row_list):
-                    return row_list[cc]
-            return None
-
-        up_left = at(r - 1, c - 1)
-        up = at(r - 1, c)
-        up_right = at(r - 1, c + 1)
-        left = at(r, c - 1)
-        right = at(r, c + 1)
-        down_left = at(r + 1, c - 1)
-        down = at(r + 1, c)
-        down_right = at(r + 1, c + 1)
-
-        return up_left, up, up_right, left, right, down_left, down, down_right
+        """Returns the surrounding slots around a square, only the ones that exist"""
+        return square.neighbours
 
     def get_number(self, slot: Cell):
         """Gets the number for a slot, doesnt work if not all slots are colored"""
-        surrounding_slots = self.get_surrounding_slots(slot)
         color = slot.color
         total = 0
-        for square in surrounding_slots:
-            if square is not None:
-                if square.color == color:
-                    total += 1
+        for square in slot.neighbours:
+            if square.color == color:
+                total += 1
         slot.number = total
 
     def fill_numbers(self):
@@ -144,8 +265,11 @@ class Board():
 
     def to_url_format(self):
         """Sends the current puzzle into a url format"""
-        alphabet = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
-        chars = []
+        return values_url(self.cell_values())
+
+    def cell_values(self) -> bytearray:
+        """The url value of every cell row by row, see url_values"""
+        values = bytearray()
 
         for row in self.rows:
             for sq in row.get_cells():
@@ -158,15 +282,14 @@ class Board():
                     # Never encountered in real world scenarios
                     raise ValueError(f"Invalid number {num_val} received")
 
-                color_bit = 0 if sq.color == "blue" else 1
+                # anything that isnt blue, even no color at all, is written as red
+                color_bit = 0 if sq.color == BLUE else 1
 
                 visible_bit = 0 if sq.hidden else 1
 
-                value = (num_val << 2) | (color_bit << 1) | visible_bit
+                values.append((num_val << 2) | (color_bit << 1) | visible_bit)
 
-                chars.append(alphabet[value])
-
-        return "".join(chars)
+        return values
 
     def fill_half_full_row(self, row)-> Tuple[Literal[True], List[Cell]] | Tuple[Literal[False], List[Cell]]:
         """Fills a row if it can be filled with a color"""
@@ -179,26 +302,46 @@ class Board():
     def __fill__(self, obj: UrjoRow | UrjoColumn, max):
         """Fills an object will required remaining colors if possible, else does nothing"""
         red, blue, uncolored = obj.count_colors()
-        squares = []
         if red == max:
-            for square in obj.get_cells():
-                if square.get_color() is None:  # uses get_color(), so only visiable colors are counted, be careful
-                    square.color = "blue"
-                    square.hidden = False
-                    squares.append(square)
-
-            return True, squares
+            fill_color = BLUE
+        elif blue == max:
+            fill_color = RED
+        else:
+            return False, []
 
-        if blue == max:
+        squares = []
+        # only walk the line when it is saturated and still has gaps
+        if uncolored > 0:
             for square in obj.get_cells():
                 if square.get_color() is None:  # uses get_color(), so only visiable colors are counted, be careful
-                    square.color = "red"
-                    square.hidden = False
+                    square.set_color(fill_color)
                     squares.append(square)
 
-            return True, squares
+        return True, squares
 
-        return False, []
+    def check_and_fill_line(self, obj: UrjoRow | UrjoColumn) -> Tuple[bool, List[Cell]]:
+        """Fills the rest of the line once a color is half full, returns False (and fills nothing) if a color is already past half"""
+        solved = obj.solve()
+        if solved is None:
+            return False, []
+        known, red = solved
+        forced = known & ~obj.known_mask
+        squares = []
+        for i, square in enumerate(obj.get_cells()):
+            if forced >> i & 1:
+                square.set_color(RED if red >> i & 1 else BLUE)
+                squares.append(square)
+        return True, squares
+
+    def reset_to_solution(self):
+        """Shows every cell and number again and clears the counters, so the solved board can be made into another puzzle"""
+        for sq in self.all_squares:
+            if sq.hidden:
+                sq.write(sq.color, False)
+            sq.number_hidden = False
+        self.trail.clear()
+        self.contradiction_count = 0
+        self.removed_by_identical = 0
 
     def unfill(self, integer):
         """Duplicate function for unfilling numbers, dont know why I made two, this code has gotten so long im not noticing a lot"""
@@ -226,33 +369,26 @@ class Board():
         if thisNumber is None:
             return False, []
 
-        all_surrounding_cells = self.get_surrounding_slots(slot)
-        surrounding_cells = [s for s in all_surrounding_cells if s is not None]
-        
-        # Should use get_color_counts instead
-        redCount = blueCount = uncoloredCount = 0
-        for slt in surrounding_cells:
-            color = slt.get_color()
-            if color == "red":
-                redCount += 1
-            elif color == "blue":
-                blueCount += 1
-            else:
-                uncoloredCount += 1
+        surrounding_cells = slot.neighbours
+
+        # kept up to date by Cell.write so nothing gets recounted
+        redCount = slot.around_red
+        blueCount = slot.around_blue
+        uncoloredCount = slot.neighbour_count - redCount - blueCount
 
         # Just double checking the target isnt something stupid like 13 or lower then 0 which can technically be encoded
-        if thisNumber < 0 or thisNumber > len(surrounding_cells):
+        if thisNumber < 0 or thisNumber > slot.neighbour_count:
             return False, []
 
         required_same = thisNumber
-        required_opp = len(surrounding_cells) - thisNumber
+        required_opp = slot.neighbour_count - thisNumber
 
         changed = False
         changed_cells = []
 
         # possibly determine the number cell's color
         def feasible_if_color(color):
-            if color == "red":
+            if color == RED:
                 same_count, opp_count = redCount, blueCount
             else:
                 same_count, opp_count = blueCount, redCount
@@ -264,11 +400,10 @@ class Board():
 
         this_color = slot.get_color()
         if this_color is None:
-            can_be_red = feasible_if_color("red")
-            can_be_blue = feasible_if_color("blue")
+            can_be_red = feasible_if_color(RED)
+            can_be_blue = feasible_if_color(BLUE)
             if can_be_red != can_be_blue:
-                slot.color = "red" if can_be_red else "blue"
-                slot.hidden = False
+                slot.set_color(RED if can_be_red else BLUE)
                 changed = True
                 changed_cells.append(slot)
                 this_color = slot.color
@@ -280,19 +415,18 @@ class Board():
 
         # forced fills among surrounding slots due to number
 
-        if this_color == "red":
+        if this_color == RED:
             same_count, opp_count = redCount, blueCount
-            same_color, opp_color = "red", "blue"
+            same_color, opp_color = RED, BLUE
         else:
             same_count, opp_count = blueCount, redCount
-            same_color, opp_color = "blue", "red"
+            same_color, opp_color = BLUE, RED
 
         # same meets target (unassigned must be opposite)
         if same_count == required_same and uncoloredCount > 0:
             for s in surrounding_cells:
                 if s.get_color() is None:
-                    s.color = opp_color
-                    s.hidden = False
+                    s.set_color(opp_color)
                     changed = True
                     changed_cells.append(s)
             return changed, changed_cells
@@ -301,8 +435,7 @@ class Board():
         if opp_count == required_opp and uncoloredCount > 0:
             for s in surrounding_cells:
                 if s.get_color() is None:
-                    s.color = same_color
-                    s.hidden = False
+                    s.set_color(same_color)
                     changed = True
                     changed_cells.append(s)
             return changed, changed_cells
@@ -311,8 +444,7 @@ class Board():
         if same_count + uncoloredCount == required_same and uncoloredCount > 0:
             for s in surrounding_cells:
                 if s.get_color() is None:
-                    s.color = same_color
-                    s.hidden = False
+                    s.set_color(same_color)
                     changed = True
                     changed_cells.append(s)
             return changed, changed_cells
@@ -321,7 +453,7 @@ class Board():
         if opp_count + uncoloredCount == required_opp and uncoloredCount > 0:
             for s in surrounding_cells:
                 if s.get_color() is None:
-                    s.color = opp_color
+                    s.set_color(opp_color, s.hidden)
                     changed = True
                     changed_cells.append(s)
             return changed, changed_cells
@@ -0,0 +1,86 @@
+import time
+
+from typing import Callable, NamedTuple
+
+
+class GenerationProgress(NamedTuple):
+    """How far uncolor_board has got, handed to rejection hooks after every cell"""
+    removed: int            # cells hidden so far
+    contradictions: int     # of those, how many needed a guess (board.contradiction_count so far)
+    visited: int            # top level uncolor_square calls so far
+    remaining: int          # cells still to visit, so at most this many more can be hidden
+    steps: int              # can_be_color searches so far
+    seconds: float          # since uncolor_board started
+
+
+# returns why the board should be given up on, or None to keep going
+type RejectHook = Callable[[GenerationProgress], str | None]
+
+
+class PuzzleRejected(Exception):
+    """Raised out of create_puzzle when a board is given up on, reason says why and progress how far it got"""
+
+    def __init__(self, reason: str, progress: GenerationProgress | None = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.progress = progress
+
+
+class Budget():
+    """
+    Counts can_be_color searches and aborts the puzzle once max_steps of them or seconds of time have been used.
+    Checked on every search, so even one slow cell cant run far past the deadline
+    """
+
+    def __init__(self, seconds: float | None = None, max_steps: int | None = None):
+        self.seconds = seconds
+        self.max_steps = max_steps
+        self.start = time.perf_counter()
+        self.steps = 0
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def step(self):
+        """one more search, raises PuzzleRejected if that goes over the budget"""
+        self.steps += 1
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise PuzzleRejected(f"step budget of {self.max_steps} used up")
+        self.check()
+
+    def check(self):
+        """raises PuzzleRejected if the deadline has passed, for waiting on work that isnt counted in steps"""
+        if self.seconds is not None and self.elapsed() > self.seconds:
+            raise PuzzleRejected(f"deadline of {self.seconds}s passed")
+
+
+def require_contradictions(target: int) -> RejectHook:
+    """
+    Rejects as soon as the board cant reach target contradictions anymore,
+    every cell adds at most one so that is when the ones found plus the cells left fall short
+    """
+    def hook(progress: GenerationProgress) -> str | None:
+        if progress.contradictions + progress.remaining < target:
+            return (f"only {progress.contradictions} contradictions with {progress.remaining} cells left, "
+                    f"{target} needed")
+        return None
+    return hook
+
+
+def projected_contradictions(target: int, after: float = 0.5, power: float = 4.0) -> RejectHook:
+    """
+    A guess rather than a bound, once after (a fraction) of the cells have been visited it rejects boards
+    that wouldnt reach target if contradictions keep growing like visited ** power. They bunch up at the end
+    since late cells sit in a mostly hidden board, on 8x8 at depth 2 a power of about 4 fits.
+    Can throw away boards that would have made it, tune after and power against the reasons it gives
+    """
+    def hook(progress: GenerationProgress) -> str | None:
+        total = progress.visited + progress.remaining
+        if progress.visited == 0 or progress.visited < after * total:
+            return None
+        projected = progress.contradictions * (total / progress.visited) ** power
+        if projected < target:
+            return (f"{progress.contradictions} contradictions after {progress.visited} of {total} cells, "
+                    f"projected {projected:.1f} of {target}")
+        return None
+    return hook
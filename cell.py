@@ -1,11 +1,19 @@
 from lines import *
-from typing import Literal, Any
+from typing import Any, Tuple
 
 
-type Color = Literal["blue"] | Literal["red"]
+# colors are stored as small ints, matching the color bit of the url format, None is still uncolored
+BLUE = 0
+RED = 1
+COLOR_NAMES = ("blue", "red")
+
+type Color = int
 
 class Cell():
     """One Square for Urjo"""
+    __slots__ = ("color", "hidden", "number", "posY", "posX", "row", "column", "neighbours", "neighbour_count",
+                 "around_red", "around_blue", "zobrist_red", "zobrist_blue", "board", "number_hidden")
+
     def __init__(self, board, color: Color | None, row_index, column_index, hidden = False, number_hidden = False, number: int | None = None):
         self.color: Color | None = color
         self.hidden: bool = hidden
@@ -15,28 +23,111 @@ class Cell():
         
         self.row: Any
         self.column: Any
+        # filled in by Board.link_neighbours from the shared neighbour table
+        self.neighbours: Tuple[Cell, ...] = ()
+        self.neighbour_count: int = 0
+        # visible red/blue neighbours, kept up to date by write so numbered cells never recount
+        self.around_red: int = 0
+        self.around_blue: int = 0
+        # this cells part of Board.zobrist, set by Board.link_neighbours
+        self.zobrist_red: int = 0
+        self.zobrist_blue: int = 0
         
         self.board = board
         self.number_hidden: bool = number_hidden
 
+    def reset(self):
+        """Back to an empty cell, only for Board.reset which clears the line counters and hash itself"""
+        self.color = None
+        self.hidden = False
+        self.number = None
+        self.number_hidden = False
+        self.around_red = 0
+        self.around_blue = 0
+
     def get_number(self) -> int | None:
         """Returns the number if the number is visable"""
         if self.number_hidden:
             return None
         return self.number
 
-    def get_color(self) -> Literal["red", "blue"] | None:
+    def get_color(self) -> Color | None:
         """Returns the color if the number is visable"""
         if self.hidden:
             return None
         return self.color
 
-def invert_color(color: Color | None) -> Literal["red", "blue"] | None:
-    """Returns the opposite color as a string"""
-    if color == "blue":
-        return "red"
-    if color == "red":
-        return "blue"
+    def write(self, color: Color | None, hidden: bool):
+        """The one place color and hidden get changed, keeps the visible color counters, line masks and the board hash in step"""
+        old = None if self.hidden else self.color
+        new = None if hidden else color
+        self.color = color
+        self.hidden = hidden
+        if old != new:
+            board = self.board
+            if old == RED:
+                board.zobrist ^= self.zobrist_red
+            elif old == BLUE:
+                board.zobrist ^= self.zobrist_blue
+            if new == RED:
+                board.zobrist ^= self.zobrist_red
+            elif new == BLUE:
+                board.zobrist ^= self.zobrist_blue
+            for line, bit in ((self.row, 1 << self.posY), (self.column, 1 << self.posX)):
+                if old == RED:
+                    line.red_count -= 1
+                elif old == BLUE:
+                    line.blue_count -= 1
+                if new == RED:
+                    line.red_count += 1
+                    line.known_mask |= bit
+                    line.red_mask |= bit
+                elif new == BLUE:
+                    line.blue_count += 1
+                    line.known_mask |= bit
+                    line.red_mask &= ~bit
+                else:
+                    line.known_mask &= ~bit
+                    line.red_mask &= ~bit
+            for neighbour in self.neighbours:
+                if old == RED:
+                    neighbour.around_red -= 1
+                elif old == BLUE:
+                    neighbour.around_blue -= 1
+                if new == RED:
+                    neighbour.around_red += 1
+                elif new == BLUE:
+                    neighbour.around_blue += 1
+
+    def slack(self, color: Color) -> Tuple[int, int]:
+        """How many more same and opposite colored neighbours the number allows if this cell is color, negative means it is already broken"""
+        if color == RED:
+            same, opp = self.around_red, self.around_blue
+        else:
+            same, opp = self.around_blue, self.around_red
+        return self.number - same, self.neighbour_count - self.number - opp
+
+    def is_tight(self) -> bool:
+        """Whether the visible number can force anything right now, exactly when Board.tryToFill would change something"""
+        color = self.get_color()
+        if color is not None:
+            if self.around_red + self.around_blue == self.neighbour_count:
+                return False
+            same, opp = self.slack(color)
+            return same == 0 or opp == 0
+        red_same, red_opp = self.slack(RED)
+        blue_same, blue_opp = self.slack(BLUE)
+        return (red_same >= 0 and red_opp >= 0) != (blue_same >= 0 and blue_opp >= 0)
+
+    def set_color(self, color: Color | None, hidden: bool = False):
+        """Sets the color and hidden flag, pushing the old values onto the board's trail so it can be undone"""
+        self.board.trail.append((self, self.color, self.hidden))
+        self.write(color, hidden)
+
+def invert_color(color: Color | None) -> Color | None:
+    """Returns the opposite color (RED for BLUE and the other way round), None stays None"""
+    if color == BLUE or color == RED:
+        return color ^ 1
     if color == None:
         return None
     raise Exception(f"Invalid color '{color}' provided!")
\ No newline at end of file
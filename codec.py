@@ -0,0 +1,125 @@
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+from board import Board, BoardPool, URL_DECODE, URL_ENCODE, URL_ALPHABET, values_url
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Many urls at once. Everything here gives exactly what Board.to_url_format and Board.from_url give board by board,
+# the speed comes from joining the urls and translating them with the tables in board.py in one go
+
+
+def _check_lengths(urls: Sequence[str], cells: int):
+    if any(len(url) != cells for url in urls):
+        raise ValueError("URL length does not match provided dimensions")
+
+
+def _decode_joined(urls: Sequence[str]) -> bytes:
+    """the cell values of every url back to back"""
+    joined = "".join(urls)
+    try:
+        values = joined.encode("ascii").translate(URL_DECODE)
+    except UnicodeEncodeError:
+        values = b"\xff"
+    if 255 in values:
+        bad = next(url for url in urls if not url.isascii() or 255 in url.encode("ascii").translate(URL_DECODE))
+        raise ValueError(f"Invalid character in url {bad!r}")
+    return values
+
+
+def _encode_joined(values: bytes | bytearray, cells: int) -> List[str]:
+    """splits back to back cell values into one url per board"""
+    if values and max(values) >= len(URL_ALPHABET):
+        raise ValueError(f"Cell value {max(values)} has no url character")
+    joined = values.translate(URL_ENCODE).decode("ascii")
+    return [joined[i:i + cells] for i in range(0, len(joined), cells)]
+
+
+def decode_urls(urls: Sequence[str], dim1: int, dim2: int) -> List[bytes]:
+    """The cell values (see board.url_values) of every url, row by row, without building any cells"""
+    cells = dim1 * dim2
+    _check_lengths(urls, cells)
+    values = _decode_joined(urls)
+    return [values[i:i + cells] for i in range(0, len(values), cells)]
+
+
+def encode_values(values: Iterable[bytes | bytearray]) -> List[str]:
+    """decode_urls backwards, boards of any shape can be mixed"""
+    values = list(values)
+    if not values:
+        return []
+    cells = len(values[0])
+    if any(len(v) != cells for v in values):
+        return [values_url(v) for v in values]
+    return _encode_joined(b"".join(values), cells)
+
+
+def encode_boards(boards: Iterable[Board]) -> List[str]:
+    """to_url_format of every board"""
+    return encode_values(board.cell_values() for board in boards)
+
+
+def decode_boards(urls: Sequence[str], dim1: int, dim2: int, pool: BoardPool | None = None) -> List[Board]:
+    """
+    Board.from_url of every url, the boards come from pool if given. Building the cells of a board
+    is most of what from_url costs, so when the boards are only looked at one at a time iter_boards is much faster
+    """
+    return [Board.from_values(values, dim1, dim2, pool.acquire(dim1, dim2) if pool is not None else None)
+            for values in decode_urls(urls, dim1, dim2)]
+
+
+def iter_boards(urls: Iterable[str], dim1: int, dim2: int, batch: int = 4096) -> Iterator[Board]:
+    """
+    Lazily decodes every url into the same board, which is only valid until the next one is yielded,
+    so its cells are built once instead of once per url
+    """
+    board = Board()
+    pending: List[str] = []
+    for url in urls:
+        pending.append(url)
+        if len(pending) >= batch:
+            for values in decode_urls(pending, dim1, dim2):
+                yield Board.from_values(values, dim1, dim2, board)
+            pending = []
+    for values in decode_urls(pending, dim1, dim2):
+        yield Board.from_values(values, dim1, dim2, board)
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("numpy is needed for the array codecs, install it or use decode_urls and encode_values")
+
+
+def decode_array(urls: Sequence[str], dim1: int, dim2: int) -> "np.ndarray":
+    """
+    The cell values of N urls as an (N, dim2, dim1) uint8 array, row major like the url,
+    split it into colors, visibility and numbers with cell_fields
+    """
+    _require_numpy()
+    _check_lengths(urls, dim1 * dim2)
+    return np.frombuffer(_decode_joined(urls), dtype=np.uint8).reshape(len(urls), dim2, dim1)
+
+
+def encode_array(values: "np.ndarray") -> List[str]:
+    """decode_array backwards, values is (N, dim2, dim1) or (N, cells)"""
+    _require_numpy()
+    values = np.ascontiguousarray(values, dtype=np.uint8)
+    cells = values[0].size if len(values) else 0
+    return _encode_joined(values.tobytes(), cells) if cells else [""] * len(values)
+
+
+def cell_fields(values: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """
+    (color, visible, number) arrays of the same shape as values, color 1 for red (a hidden cell keeps its solution color),
+    visible 1 for shown cells and number the shown number or -1 (int8)
+    """
+    _require_numpy()
+    return (values >> 1) & 1, values & 1, (values >> 2).astype(np.int8) - 1
+
+
+def from_fields(color: "np.ndarray", visible: "np.ndarray", number: "np.ndarray") -> "np.ndarray":
+    """cell_fields backwards, number -1 for no shown number"""
+    _require_numpy()
+    return (((number.astype(np.int16) + 1) << 2) | (color.astype(np.int16) << 1) | visible).astype(np.uint8)
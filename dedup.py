@@ -0,0 +1,160 @@
+import hashlib
+import math
+
+from operator import itemgetter
+from typing import Callable, Dict, Iterable, Tuple
+
+from board import Board, url_values, values_url
+
+# the color bit of every cell value flipped, for bytes.translate
+COLOR_SWAP = bytes(value ^ 2 for value in range(256))
+
+# per shape, one function per rotation/reflection that takes the cell values to those of the moved board
+_symmetries: Dict[Tuple[int, int], Tuple[Callable[[bytes], bytes], ...]] = {}
+
+
+def symmetries(width: int, height: int) -> Tuple[Callable[[bytes], bytes], ...]:
+    """
+    The rotations and reflections that keep the board's shape, all 8 on a square board and the 4 that dont
+    turn it on its side otherwise (a turned 6x5 is a 5x6 puzzle, which is its own shape). Identity first
+    """
+    table = _symmetries.get((width, height))
+    if table is None:
+        # where cell (y, x) of the moved board comes from
+        maps = [lambda y, x: (y, x), lambda y, x: (y, width - 1 - x),
+                lambda y, x: (height - 1 - y, x), lambda y, x: (height - 1 - y, width - 1 - x)]
+        if width == height:
+            n = width
+            maps += [lambda y, x: (x, y), lambda y, x: (n - 1 - x, n - 1 - y),
+                     lambda y, x: (n - 1 - x, y), lambda y, x: (x, n - 1 - y)]
+        table = []
+        for source in maps:
+            order = [sy * width + sx for y in range(height) for x in range(width) for sy, sx in (source(y, x),)]
+            getter = itemgetter(*order)
+            table.append(lambda values, getter=getter: bytes(getter(values)))
+        table = tuple(table)
+        _symmetries[(width, height)] = table
+    return table
+
+
+def canonical_values(values: bytes, width: int, height: int) -> bytes:
+    """The smallest of the cell values over every symmetry, with and without red and blue swapped"""
+    swapped = values.translate(COLOR_SWAP)
+    return min(min(move(values), move(swapped)) for move in symmetries(width, height))
+
+
+def canonical_url(url: str, width: int, height: int) -> str:
+    """
+    The url every rotation, reflection and red/blue swap of this puzzle maps to, so two puzzles are the same
+    up to those exactly when their canonical urls are. Swapping colors keeps every number, they count same colored neighbours
+    """
+    if len(url) != width * height:
+        raise ValueError("URL length does not match provided dimensions")
+    return values_url(canonical_values(url_values(url), width, height))
+
+
+def canonical_board(board: Board) -> str:
+    """canonical_url of a board"""
+    width, height = board.shape()
+    return values_url(canonical_values(bytes(board.cell_values()), width, height))
+
+
+def canonical_key(url: str, width: int, height: int) -> bytes:
+    """16 byte digest of the shape and canonical url, what the filters store"""
+    canonical = canonical_values(url_values(url), width, height)
+    return hashlib.blake2b(canonical, digest_size=16, person=f"{width}x{height}".encode()).digest()
+
+
+class ExactFilter():
+    """Remembers every key, 16 byte digests so two different puzzles only clash with odds of about 2**-128"""
+
+    def __init__(self):
+        self.keys = set()
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self.keys
+
+    def add(self, key: bytes) -> bool:
+        """False if key was already there"""
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        return True
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class BloomFilter():
+    """
+    Fixed memory for corpora too big to keep every key, sized for capacity keys at error_rate false positives.
+    A false positive throws a new puzzle away as a duplicate, a duplicate is never let through.
+    Past capacity the error rate climbs
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 1e-6):
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError("BloomFilter needs a positive capacity and an error_rate between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _bits(self, key: bytes):
+        """the (byte, mask) of every bit key sets"""
+        # double hashing on the two halves of the digest
+        first = int.from_bytes(key[:8], "little")
+        second = int.from_bytes(key[8:16], "little") | 1
+        for i in range(self.hashes):
+            bit = (first + i * second) % self.size
+            yield bit >> 3, 1 << (bit & 7)
+
+    def __contains__(self, key: bytes) -> bool:
+        """True if key was probably added, without adding it"""
+        return all(self.bits[byte] & mask for byte, mask in self._bits(key))
+
+    def add(self, key: bytes) -> bool:
+        """False if key was probably already there"""
+        new = False
+        for byte, mask in self._bits(key):
+            if not self.bits[byte] & mask:
+                self.bits[byte] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class PuzzleDeduper():
+    """
+    Streaming filter that lets a puzzle through only the first time it or any symmetric copy of it is seen.
+    kind is "bloom" (a BloomFilter of capacity and error_rate, fixed memory) or "exact" (an ExactFilter,
+    which grows with every puzzle so only for runs of known size)
+    """
+
+    def __init__(self, kind="bloom", capacity: int = 10_000_000, error_rate: float = 1e-6):
+        if kind == "exact":
+            self.filter = ExactFilter()
+        elif kind == "bloom":
+            self.filter = BloomFilter(capacity, error_rate)
+        else:
+            raise ValueError(f"Unknown dedup filter '{kind}', expected exact or bloom")
+        self.seen = 0
+        self.duplicates = 0
+
+    def add(self, url: str, width: int, height: int) -> bool:
+        """True if the puzzle is new, False if it (or a symmetric copy) came through before"""
+        self.seen += 1
+        if self.filter.add(canonical_key(url, width, height)):
+            return True
+        self.duplicates += 1
+        return False
+
+    def add_records(self, records: Iterable[dict]) -> int:
+        """feeds already written records (say read_records of an earlier run) through, returns how many were new"""
+        return sum(self.add(record["url"], record["width"], record["height"]) for record in records)
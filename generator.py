@@ -1,13 +1,35 @@
 from board import *
-from typing import List
+from bitboard import BitBoard
+from transposition import TranspositionCache
+from sampler import get_sampler, sampler_fits
+from ordering import CandidateOrder, get_candidate_order, random_order
+from parallel import CandidatePool
+from solver import check_unique
+from budget import Budget, GenerationProgress, PuzzleRejected, RejectHook, require_contradictions, projected_contradictions
+from typing import List, Tuple
 from collections import deque
 
 class UrjoGenerator():
     board: Board
 
-    def __init__(self):
-        self.board = Board()
+    def __init__(self, board: Board | None = None, board_pool: BoardPool | None = None):
+        # pass in a board (say from a BoardPool) to reuse its cells
+        self.board = board if board is not None else Board()
+        # with a pool, switching shapes hands the old board back and takes one of the new shape out,
+        # so a generator that makes several shapes keeps the cells of each instead of rebuilding every time
+        self.board_pool = board_pool
         self.removed_by_identical: int = 0
+        # the contradiction search samples from its own generator so caching (which skips samples) never moves the global one
+        self.search_random = random.Random()
+        self.cache: TranspositionCache | None = None
+        # which uncolored cells the contradiction search tries first, see ordering.py
+        self.candidate_order: CandidateOrder = random_order
+        # the step and time budget of the puzzle being made, None when there isnt one
+        self.budget: Budget | None = None
+        # puzzles create_puzzles_from_grid gave up on, so callers can see why
+        self.rejections: List[PuzzleRejected] = []
+        # process pool for search_workers, kept between puzzles since starting one costs more than most searches
+        self.search_pool: CandidatePool | None = None
 
     def number_check(self, slot: Cell):
         """Checks if the number rule is violated"""
@@ -21,9 +43,10 @@ class UrjoGenerator():
         if slot.row is None:
             raise Exception("Cannot use outside of a row")
 
-        red, blue, uncolored = get_color_counts(
-            list(self.board.get_surrounding_slots(slot)))
-        surroundingCellCount = red + blue + uncolored
+        red = slot.around_red
+        blue = slot.around_blue
+        surroundingCellCount = slot.neighbour_count
+        uncolored = surroundingCellCount - red - blue
 
         # impossible number
         if number < 0 or number > surroundingCellCount:
@@ -51,9 +74,9 @@ class UrjoGenerator():
         color = slot.get_color()
 
         if color is not None:
-            if color == "blue":
+            if color == BLUE:
                 return feasible(number, blue, red, uncolored)
-            elif color == "red":
+            elif color == RED:
                 return feasible(number, red, blue, uncolored)
             else:
                 return False
@@ -62,107 +85,123 @@ class UrjoGenerator():
             ok_red = feasible(number, red, blue, uncolored)
             return ok_blue or ok_red
 
-    def fill_board_backtracking(self, randomize_colors=True):
+    def fill_board_backtracking(self, randomize_colors=True, line_checks=False):
         """
         Color the whole board using backtracking so no row or column violates allowed_size, fill rules, or,
         creates identical adjacent rows/columns. this doesnt take numbers into account at all, only filling a possible
-        color arangement
+        color arangement. line_checks=True fills lines with Board.check_and_fill_line instead of fill_half_full_row/column.
+        Uses its own stack instead of recursion so big boards dont hit the recursion limit
         """
         cells: List[Cell] = [
             sq for row in self.board.rows for sq in row.get_cells()]
 
-        def backtrack(index=0):
+        # one frame per guessed cell: [cell index, colors left to try, trail mark from before the current try]
+        stack: List[list] = []
+        index = 0
+        filled = True
+        while filled:
+            # cells the fills already colored dont need a guess
+            while index < len(cells) and cells[index].color is not None:
+                index += 1
             if index >= len(cells):
-                return True
-
-            currentCell: Cell | None = cells[index]
-            if currentCell.color is not None:
-                return backtrack(index + 1)
-
-            colors: List[Color] = ["red", "blue"]
-            if randomize_colors:
-                random.shuffle(colors)
+                break
 
+            currentCell = cells[index]
             if currentCell.row is None or currentCell.column is None:
                 raise Exception("Cannot use on a sole cell!")
 
-            currentRow: List[Cell] = currentCell.row.get_cells()
-            currentCol: List[Cell] = currentCell.column.get_cells()
-
-            for color in colors:
-                row_snapshot: List[Color | None] = [
-                    sq.color for sq in currentRow]
-                col_snapshot: List[Color | None] = [
-                    sq.color for sq in currentCol]
-
-                currentCell.color = color
-
-                # capture both the boolean and the list of squares that were auto-filled
-                row_filled, row_changed = self.board.fill_half_full_row(
-                    currentCell.row)
-                col_filled, col_changed = self.board.fill_half_full_column(
-                    currentCell.column)
-
-                # run all checks
-                checks_ok = True
-                if not currentCell.row.check_color_count():
-                    checks_ok = False
-                if not currentCell.column.check_color_count():
+            colors: List[Color] = [RED, BLUE]
+            if randomize_colors:
+                random.shuffle(colors)
+            stack.append([index, colors, 0])
+
+            # try the next color of the top frame, popping frames that ran out until one works
+            while True:
+                if not stack:
+                    filled = False  # no color worked anywhere so the board cant be filled
+                    break
+                frame = stack[-1]
+                if not frame[1]:
+                    stack.pop()
+                    if stack:
+                        # the guess below this one didnt work out either
+                        self.board.undo_to(stack[-1][2])
+                    continue
+                color = frame[1].pop(0)
+                frame[2] = self.board.trail_mark()
+                if self._try_fill_color(cells[frame[0]], color, line_checks):
+                    index = frame[0] + 1
+                    break
+                # undo the color and everything the fills wrote
+                self.board.undo_to(frame[2])
+
+        # the coloring is kept, so nothing left on the trail should ever be undone
+        self.board.trail.clear()
+        return filled
+
+    def _try_fill_color(self, cell: Cell, color: Color, line_checks=False) -> bool:
+        """Colors a cell for fill_board_backtracking, fills its lines and checks them. The caller undoes it if this fails"""
+        cell.set_color(color)
+
+        # capture both the boolean and the list of squares that were auto-filled
+        checks_ok = True
+        if line_checks:
+            row_filled, row_changed = self.board.check_and_fill_line(cell.row)
+            col_filled, col_changed = self.board.check_and_fill_line(cell.column)
+            # here filled means a valid coloring of the line is still possible
+            checks_ok = row_filled and col_filled
+        else:
+            row_filled, row_changed = self.board.fill_half_full_row(
+                cell.row)
+            col_filled, col_changed = self.board.fill_half_full_column(
+                cell.column)
+
+        # run all checks
+        if not cell.row.check_color_count():
+            checks_ok = False
+        if not cell.column.check_color_count():
+            checks_ok = False
+
+        # # check adjacent rows/columns for identity regardless of fill
+        # if cell.posX > 0:
+        #     if self.board.rows[cell.posX - 1] == cell.row:
+        #         checks_ok = False
+        # if cell.posX < len(self.board.rows) - 1:
+        #     if self.board.rows[cell.posX + 1] == cell.row:
+        #         checks_ok = False
+        # if cell.posY > 0:
+        #     if self.board.columns[cell.posY - 1] == cell.column:
+        #         checks_ok = False
+        # if cell.posY < len(self.board.columns) - 1:
+        #     if self.board.columns[cell.posY + 1] == cell.column:
+        #         checks_ok = False
+
+        # if row_filled and not nonIdentical(self.board.rows, cell.posX):
+        #     checks_ok = False
+        # if col_filled and not nonIdentical(self.board.columns, cell.posY):
+        #     checks_ok = False
+
+        for change in row_changed:
+            # Commented out because i don't know where this function went
+            col: UrjoColumn = change.column
+            if not col.check_color_count():
+                checks_ok = False
+                break
+            # if not self.board.check_identical(change):
+            #     checks_ok = False
+            #     break
+
+        if checks_ok:
+            for change in col_changed:
+                row: UrjoRow = change.row
+                if not row.check_color_count():
                     checks_ok = False
-
-                # # check adjacent rows/columns for identity regardless of fill
-                # if currentCell.posX > 0:
-                #     if self.board.rows[currentCell.posX - 1] == currentCell.row:
-                #         checks_ok = False
-                # if currentCell.posX < len(self.board.rows) - 1:
-                #     if self.board.rows[currentCell.posX + 1] == currentCell.row:
-                #         checks_ok = False
-                # if currentCell.posY > 0:
-                #     if self.board.columns[currentCell.posY - 1] == currentCell.column:
-                #         checks_ok = False
-                # if currentCell.posY < len(self.board.columns) - 1:
-                #     if self.board.columns[currentCell.posY + 1] == currentCell.column:
-                #         checks_ok = False
-
-                # if row_filled and not nonIdentical(self.board.rows, currentCell.posX):
-                #     checks_ok = False
-                # if col_filled and not nonIdentical(self.board.columns, currentCell.posY):
+                    break
+                # if not self.board.check_identical(change):
                 #     checks_ok = False
+                #     break
 
-                for change in row_changed:
-                    # Commented out because i don't know where this function went
-                    col: UrjoColumn = change.column
-                    if not col.check_color_count():
-                        checks_ok = False
-                        break
-                    # if not self.board.check_identical(change):
-                    #     checks_ok = False
-                    #     break
-
-                if checks_ok:
-                    for change in col_changed:
-                        row: UrjoRow = change.row
-                        if not row.check_color_count():
-                            checks_ok = False
-                            break
-                        # if not self.board.check_identical(change):
-                        #     checks_ok = False
-                        #     break
-
-                if checks_ok:
-                    if backtrack(index + 1):
-                        return True  # success
-
-                # restore snapshots
-                for sq, old in zip(currentRow, row_snapshot):
-                    sq.color = old
-                for sq, old in zip(currentCol, col_snapshot):
-                    sq.color = old
-                currentCell.color = None
-
-            return False  # no color worked so backtrack
-
-        return backtrack(0)
+        return checks_ok
 
     def fill_row(self, row: UrjoRow):
         """Fills a row if it can be filled with a color"""
@@ -175,26 +214,22 @@ class UrjoGenerator():
     def __fill__(self, obj: UrjoRow | UrjoColumn, max):
         """Fills an object will required remaining colors if possible, else does nothing"""
         red, blue, uncolored = obj.count_colors()
-        squares = []
         if red == max:
-            for square in obj.get_cells():
-                if square.get_color() is None:  # uses get_color(), so only visiable colors are counted, be careful
-                    square.color = "blue"
-                    square.hidden = False
-                    squares.append(square)
-
-            return True, squares
+            fill_color = BLUE
+        elif blue == max:
+            fill_color = RED
+        else:
+            return False, []
 
-        if blue == max:
+        squares = []
+        # only walk the line when it is saturated and still has gaps
+        if uncolored > 0:
             for square in obj.get_cells():
                 if square.get_color() is None:  # uses get_color(), so only visiable colors are counted, be careful
-                    square.color = "red"
-                    square.hidden = False
+                    square.set_color(fill_color)
                     squares.append(square)
 
-            return True, squares
-
-        return False, []
+        return True, squares
 
     def unfill(self, integer: int):
         """Duplicate function for unfilling numbers, dont know why I made two, this code has gotten so long im not noticing a lot"""
@@ -213,22 +248,39 @@ class UrjoGenerator():
 
         for row in self.board.rows:
             for square in row.cells:
-                square.hidden = False
+                square.write(square.color, False)
             checks.append(row.check_color_count())
 
         for column in self.board.columns:
             for square in column.cells:
-                square.hidden = False
+                square.write(square.color, False)
             checks.append(column.check_color_count())
         if not all(checks):
             print("CHECK FAILED:", puzzle)
 
     # IDENTICAL CHECKS DONT WORK DONT TURN ON
 
-    def create_puzzle(self, dim1: int, dim2: int, number_checks=True, row_checks=True, identical_checks=False, contradiction_count=1, number_of_numbers=0, max_steps_without_info=4):
-        """Creates a full puzzle from the inputs"""
-
-        self.create_full_board(dim1, dim2)
+    def create_puzzle(self, dim1: int, dim2: int, number_checks=True, row_checks=True, identical_checks=False,
+                      contradiction_count=1, number_of_numbers=0, max_steps_without_info=4, *, uniform_grid=False,
+                      bitboard=False, cache_size: int | None = None, line_checks=False,
+                      candidate_order: str | CandidateOrder = "random", schedule="single",
+                      deadline: float | None = None, max_steps: int | None = None, min_contradictions=0,
+                      project_after: float | None = None, reject: RejectHook | None = None,
+                      search_workers=0, verify_unique=False):
+        """Creates a full puzzle from the inputs, uniform_grid is create_full_board's uniform and the rest go to uncolor_board"""
+
+        self.create_solved_board(dim1, dim2, uniform_grid)
+        return self.uncolor_board(number_checks=number_checks, row_checks=row_checks, identical_checks=identical_checks,
+                                  contradiction_count=contradiction_count, number_of_numbers=number_of_numbers,
+                                  max_steps_without_info=max_steps_without_info, bitboard=bitboard,
+                                  cache_size=cache_size, line_checks=line_checks, candidate_order=candidate_order,
+                                  schedule=schedule, deadline=deadline, max_steps=max_steps,
+                                  min_contradictions=min_contradictions, project_after=project_after, reject=reject,
+                                  search_workers=search_workers, verify_unique=verify_unique)
+
+    def create_solved_board(self, dim1: int, dim2: int, uniform_grid=False):
+        """Creates the solution, every cell colored and numbered, which uncolor_board then makes a puzzle out of"""
+        self.create_full_board(dim1, dim2, uniform=uniform_grid)
 
         for row in self.board.rows:
             row.set_allowed_size()
@@ -237,46 +289,205 @@ class UrjoGenerator():
             column.set_allowed_size()
 
         self.board.fill_numbers()
+        return self.board
+
+    def uncolor_board(self, number_checks=True, row_checks=True, identical_checks=False, contradiction_count=1,
+                      number_of_numbers=0, max_steps_without_info=4, *, bitboard=False, cache_size: int | None = None,
+                      line_checks=False, candidate_order: str | CandidateOrder = "random", schedule="single",
+                      deadline: float | None = None, max_steps: int | None = None, min_contradictions=0,
+                      project_after: float | None = None, reject: RejectHook | None = None,
+                      search_workers=0, verify_unique=False):
+        """
+        Turns the solved board into a puzzle by hiding every cell that can be worked out. bitboard (faster, search_workers
+        spreads it over processes), cache_size and candidate_order (see ordering.py) never change the puzzle.
+        line_checks checks every line a guess touches against the half full rule, not just the guessed cell's,
+        so broken lines are caught sooner. schedule is "single" or "tiered" (a pass per depth from 0 up).
+        deadline, max_steps, min_contradictions, project_after and reject (see budget.py) raise PuzzleRejected
+        and leave the partial puzzle, verify_unique does too if solver.check_unique finds a second solution
+        """
+        if schedule == "single":
+            depths = [contradiction_count]
+        elif schedule == "tiered":
+            depths = list(range(contradiction_count + 1))
+        else:
+            raise ValueError(f"Unknown schedule '{schedule}', expected 'single' or 'tiered'")
 
         self.unfill(number_of_numbers)
 
         random.shuffle(self.board.all_squares)
-        for slot in self.board.all_squares:
-            self.uncolor_square(slot, number_checks, row_checks, identical_checks,
-                                contradiction_count, max_steps_without_info=max_steps_without_info)
+        self.search_random.seed(random.getrandbits(64))
+        # cached results are only valid for these numbers, so every puzzle gets a fresh cache
+        self.cache = TranspositionCache(cache_size) if cache_size else None
+        self.candidate_order = get_candidate_order(candidate_order)
+
+        hooks: List[RejectHook] = []
+        if min_contradictions:
+            hooks.append(require_contradictions(min_contradictions))
+            if project_after is not None:
+                hooks.append(projected_contradictions(min_contradictions, project_after))
+        if reject is not None:
+            hooks.append(reject)
+        budget = Budget(deadline, max_steps) if deadline is not None or max_steps is not None or hooks else None
+        self.budget = budget
+
+        if search_workers > 1 and not bitboard:
+            raise ValueError("search_workers needs the bitboard kernel")
+        if bitboard:
+            if identical_checks:
+                raise ValueError("The bitboard kernel doesnt support identical checks")
+            kernel = BitBoard.from_board(self.board)
+            kernel.random = self.search_random
+            kernel.cache = self.cache
+            kernel.candidate_order = self.candidate_order
+            kernel.budget = budget
+            if search_workers > 1:
+                if self.search_pool is None or self.search_pool.workers != search_workers:
+                    self.close()
+                    self.search_pool = CandidatePool(search_workers)
+                kernel.pool = self.search_pool
+            cells = kernel.order
+
+            def uncolor(index: int, depth: int) -> bool:
+                if not kernel.is_known(index):
+                    return False
+                mark = len(kernel.trail)
+                try:
+                    return kernel.uncolor_square(index, number_checks, row_checks, depth,
+                                                 max_steps_without_info=max_steps_without_info, line_checks=line_checks)
+                except PuzzleRejected:
+                    kernel.undo_to(mark)
+                    raise
+
+            def contradictions() -> int:
+                return kernel.contradiction_count
+        else:
+            cells = self.board.all_squares
+
+            def uncolor(slot: Cell, depth: int) -> bool:
+                if slot.hidden:
+                    return False
+                mark = self.board.trail_mark()
+                try:
+                    return self.uncolor_square(slot, number_checks, row_checks, identical_checks,
+                                               depth, max_steps_without_info=max_steps_without_info, line_checks=line_checks)
+                except PuzzleRejected:
+                    self.board.undo_to(mark)
+                    raise
+
+            def contradictions() -> int:
+                return self.board.contradiction_count
+
+        removed = 0
+        visited = 0
+        try:
+            for pass_index, depth in enumerate(depths):
+                last_pass = pass_index == len(depths) - 1
+                for position, cell in enumerate(cells):
+                    if uncolor(cell, depth):
+                        removed += 1
+                    visited += 1
+                    if budget is None or not hooks:
+                        continue
+                    # before the last pass every cell still showing gets another go
+                    remaining = len(cells) - position - 1 if last_pass else len(cells) - removed
+                    progress = GenerationProgress(removed, contradictions(), visited, remaining,
+                                                  budget.steps, budget.elapsed())
+                    for hook in hooks:
+                        reason = hook(progress)
+                        if reason is not None:
+                            raise PuzzleRejected(reason, progress)
+        except PuzzleRejected as rejected:
+            if rejected.progress is None:
+                rejected.progress = GenerationProgress(removed, contradictions(), visited, len(cells) - visited,
+                                                       budget.steps, budget.elapsed())
+            raise
+        finally:
+            self.budget = None
+            if bitboard:
+                kernel.apply_to(self.board)
+
+        if verify_unique:
+            uniqueness = check_unique(self.board)
+            if not uniqueness.unique:
+                reason = f"{uniqueness.solutions} solutions"
+                if uniqueness.counterexample is not None:
+                    reason += f", another one is {uniqueness.counterexample}"
+                raise PuzzleRejected(reason)
         return self.board
 
-    def create_full_board(self, dim1: int, dim2: int):
-        """Creates a full board of colors and numbers"""
-        self.board.rows = [UrjoRow([]) for _ in range(dim2)]
-        self.board.columns = [UrjoColumn([]) for _ in range(dim1)]
+    def close(self):
+        """Shuts down the search_workers pool if there is one"""
+        if self.search_pool is not None:
+            self.search_pool.close()
+            self.search_pool = None
+
+    def create_puzzles_from_grid(self, k: int, max_attempts: int | None = None, **options) -> List[Tuple[str, int]]:
+        """
+        Makes up to k distinct puzzles out of the solved board from create_solved_board, as (url, contradiction_count) pairs.
+        Each one gets its own visiting order, the board is reset to the solution in between instead
+        of being rebuilt. Repeated urls are dropped, and it gives up after max_attempts (4 * k by default) tries.
+        options are the same as uncolor_board's except number_of_numbers, unfill never hides a number
+        (self.all_numbers is always empty) so every puzzle shows all of them and the option would only pretend to vary them.
+        Rejected puzzles use up an attempt and end up in self.rejections
+        """
+        if "number_of_numbers" in options:
+            raise ValueError("create_puzzles_from_grid doesnt take number_of_numbers, every puzzle shows all the numbers")
+        if max_attempts is None:
+            max_attempts = 4 * k
+        seen = set()
+        puzzles: List[Tuple[str, int]] = []
+        self.rejections = []
+        for _ in range(max_attempts):
+            if len(puzzles) >= k:
+                break
+            self.board.reset_to_solution()
+            try:
+                board = self.uncolor_board(**options)
+            except PuzzleRejected as rejected:
+                self.rejections.append(rejected)
+                continue
+            url = board.to_url_format()
+            if url in seen:
+                continue
+            seen.add(url)
+            puzzles.append((url, board.contradiction_count))
+        return puzzles
+
+    def create_full_board(self, dim1: int, dim2: int, uniform=False):
+        """
+        Creates a full board of colors and numbers, uniform=True draws the coloring with the cached GridSampler
+        so every valid grid is equally likely, instead of the backtracking fill which favours some.
+        Shapes too big for the sampler's tables (see sampler.sampler_fits) use the backtracking fill anyway
+        """
+        # a board of the same shape from the last puzzle is reset in place instead of being rebuilt
+        if self.board_pool is not None and self.board.rows and self.board.shape() != (dim1, dim2):
+            self.board_pool.release(self.board)
+            self.board = self.board_pool.acquire(dim1, dim2)
+        else:
+            self.board.reuse(dim1, dim2)
+        self.board.all_numbers = list(self.board.all_squares)
         self.all_squares: List[Cell] = []
         self.all_numbers: List[Cell] = []
 
-        for y in range(dim2):
-            for x in range(dim1):
-                new_square = Cell(self.board, None, y, x)
-                new_square.row = self.board.rows[y]
-                new_square.column = self.board.columns[x]
-                self.board.rows[y].cells.append(new_square)
-                self.board.columns[x].cells.append(new_square)
-                self.board.all_squares.append(new_square)
-                self.board.all_numbers.append(new_square)
-
-        for row in self.board.rows:
-            row.set_allowed_size()
-        for column in self.board.columns:
-            column.set_allowed_size()
+        if uniform and sampler_fits(dim1, dim2):
+            grid = get_sampler(dim1, dim2).sample()
+            for row, reds in zip(self.board.rows, grid):
+                for square, red in zip(row.get_cells(), reds):
+                    square.write(RED if red else BLUE, False)
+            return
 
         if not self.fill_board_backtracking():
             # mostly only happens if the board is weirdly shaped in a way that makes the rules not possible
             raise ValueError("Unable to color board with current constraints")
 
-    def uncolor_square(self, square: Cell, number_checks=True, row_checks=True, identical_checks=True, contradiction_count=1, max_steps_without_info=4):
+    def uncolor_square(self, square: Cell, number_checks=True, row_checks=True, identical_checks=True, contradiction_count=1,
+                       max_steps_without_info=4, line_checks=False):
         """Sees if a square can be uncolored and the information recovered due to the other color being impossible to be there"""
-        if self.can_be_color(square, invert_color(square.color), number_checks, row_checks, identical_checks, contradiction_count, original_contradiction=contradiction_count, max_steps_without_info=max_steps_without_info):
+        if self.can_be_color(square, invert_color(square.color), number_checks, row_checks, identical_checks, contradiction_count,
+                             original_contradiction=contradiction_count, max_steps_without_info=max_steps_without_info,
+                             line_checks=line_checks):
             return False
-        square.hidden = True
+        square.write(square.color, True)
         return True
 
     def check_identical(self, slot: Cell):
@@ -301,26 +512,45 @@ class UrjoGenerator():
 
         return True
 
-    def can_be_color(self, cell: Cell, color: Literal["red", "blue"] | None,
+    def can_be_color(self, cell: Cell, color: Color | None,
                      number_checks=True, row_checks=True, identical_checks=True,
-                     contradiction_count=1, original_contradiction=1, max_steps_without_info=4):
-        # memoization: currently removed due to it causing impossible puzzles
-        memo = {}
-
-        # snapshot full board state as random colors are being changed
-        state = self.board.snapshot_state()
-
-        originalColor = cell.color
-        originalHidden = cell.hidden
+                     contradiction_count=1, original_contradiction=1, max_steps_without_info=4, line_checks=False):
+        """
+        Whether cell can be color without the checks failing within contradiction_count nested guesses.
+        Inner calls go through the transposition cache when there is one, the answer only depends on the visible board,
+        the numbers and the arguments because every uncolored cell gets sampled, so only the order is random.
+        The top level call isnt cached since it also bumps board.contradiction_count
+        """
+        cache = self.cache
+        if cache is None or contradiction_count == original_contradiction or len(self.board.all_squares) > 10000:
+            return self._can_be_color(cell, color, number_checks, row_checks, identical_checks,
+                                      contradiction_count, original_contradiction, max_steps_without_info, line_checks)
+
+        key = (self.board.zobrist, cell.posX, cell.posY, color, contradiction_count, original_contradiction,
+               max_steps_without_info, number_checks, row_checks, identical_checks, line_checks)
+        result = cache.get(key)
+        if result is None:
+            result = self._can_be_color(cell, color, number_checks, row_checks, identical_checks,
+                                        contradiction_count, original_contradiction, max_steps_without_info, line_checks)
+            cache.put(key, result)
+        return result
+
+    def _can_be_color(self, cell: Cell, color: Color | None,
+                      number_checks=True, row_checks=True, identical_checks=True,
+                      contradiction_count=1, original_contradiction=1, max_steps_without_info=4, line_checks=False):
+        if self.budget is not None:
+            self.budget.step()
+        # mark the trail as random colors are being changed, everything after it gets undone before returning
+        mark = self.board.trail_mark()
 
         # seeing what happens if it was the other color
-        cell.color = color
-        cell.hidden = False
+        cell.set_color(color)
 
         # filling in all rows and columns that you can with the new information
         queue = deque([cell])
         queued_ids = {id(cell)}
         processed_ids = set()
+        processed: List[Cell] = []
         processed_numbers = set()
 
         while queue:
@@ -328,9 +558,18 @@ class UrjoGenerator():
             currentID = id(currentCell)
             queued_ids.discard(currentID)
             processed_ids.add(currentID)
+            processed.append(currentCell)
             if row_checks:
-                row_changed = self.board.fill_half_full_row(currentCell.row)[1]
-                col_changed = self.board.fill_half_full_column(currentCell.column)[1]
+                if line_checks:
+                    row_ok, row_changed = self.board.check_and_fill_line(currentCell.row)
+                    col_ok, col_changed = self.board.check_and_fill_line(currentCell.column)
+                    # a line with no valid coloring left is a contradiction even if it isnt the guessed cell's
+                    if not (row_ok and col_ok):
+                        self.board.undo_to(mark)
+                        return False
+                else:
+                    row_changed = self.board.fill_half_full_row(currentCell.row)[1]
+                    col_changed = self.board.fill_half_full_column(currentCell.column)[1]
 
                 for ch in row_changed:
                     fid = id(ch)
@@ -344,16 +583,16 @@ class UrjoGenerator():
                         queued_ids.add(fid)
 
             if number_checks:
-                surrounding = self.board.get_surrounding_slots(currentCell)
-                for slt in surrounding:
-                    if slt is None:
-                        continue
+                for slt in currentCell.neighbours:
                     if slt.get_number() is None:
                         continue
                     sid = id(slt)
                     if sid in processed_numbers:
                         continue
                     processed_numbers.add(sid)
+                    # numbers with slack left cant force anything, so only wake the tight ones
+                    if not slt.is_tight():
+                        continue
 
                     changed, filled = self.board.tryToFill(slt)
                     if changed:
@@ -380,7 +619,7 @@ class UrjoGenerator():
 
         if not all(checks):
             # restore and return false a check fails
-            self.board.restore_state(state)
+            self.board.undo_to(mark)
             return False
 
         # only continue deeper if something else got filled in if you are passed some step count in
@@ -391,33 +630,57 @@ class UrjoGenerator():
         if contradiction_count > 0 and should_continue:
             change_available = [
                 square for square in self.board.all_squares if square.get_color() is None]
-            k = min(10000, len(change_available))
-            samples = random.sample(change_available, k) if k > 0 else []
+            # cells next to or in line with what this guess just filled in come first among equally tight ones
+            near_ids = {id(n) for p in processed for n in p.neighbours}
+            near_rows = {p.posX for p in processed}
+            near_columns = {p.posY for p in processed}
+
+            def score(square: Cell):
+                near = id(square) in near_ids or square.posX in near_rows or square.posY in near_columns
+                return self.candidate_slack(square), not near
+
+            samples = self.candidate_order(change_available, self.search_random, score)
             for sample in samples:
-                ok_blue = self.can_be_color(sample, "blue",
-                                            number_checks, row_checks, identical_checks,
-                                            contradiction_count - 1, original_contradiction)
-                ok_red = self.can_be_color(sample, "red",
-                                           number_checks, row_checks, identical_checks,
-                                           contradiction_count - 1, original_contradiction)
-                if not ok_blue and not ok_red:
+                # a cell that can be blue cant be a contradiction, so red is only tried when blue fails
+                if self.can_be_color(sample, BLUE,
+                                     number_checks, row_checks, identical_checks,
+                                     contradiction_count - 1, original_contradiction, line_checks=line_checks):
+                    continue
+                if not self.can_be_color(sample, RED,
+                                         number_checks, row_checks, identical_checks,
+                                         contradiction_count - 1, original_contradiction, line_checks=line_checks):
                     if contradiction_count == original_contradiction:
                         self.board.contradiction_count += 1
-                    self.board.restore_state(state)
+                    self.board.undo_to(mark)
 
                     return False
 
         # restore and return True
-        self.board.restore_state(state)
+        self.board.undo_to(mark)
 
         return True
 
+    def candidate_slack(self, cell: Cell) -> int:
+        """How far the cell's row, column and the numbers around it are from forcing it, lower is more constrained"""
+        row = cell.row
+        column = cell.column
+        slack = min(row.color_count - max(row.red_count, row.blue_count),
+                    column.color_count - max(column.red_count, column.blue_count))
+        for neighbour in cell.neighbours:
+            if neighbour.get_number() is None:
+                continue
+            color = neighbour.get_color()
+            for number_color in ((color,) if color is not None else (RED, BLUE)):
+                same, opp = neighbour.slack(number_color)
+                if same >= 0 and opp >= 0:
+                    slack = min(slack, same, opp)
+        return slack
+
     def check_surrounding_numbers(self, slot):
         """
         Check whether every surrounding numbered cell's checks pass
         """
-        for slot in self.board.get_surrounding_slots(slot):
-            if slot is not None:
-                if not self.number_check(slot):
-                    return False
+        for slot in slot.neighbours:
+            if not self.number_check(slot):
+                return False
         return True
@@ -0,0 +1,96 @@
+import math
+
+from typing import Iterable, Tuple
+
+from board import Board
+from cell import RED
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Whole stacks of solved grids at once with numpy, an (N, height, width) array with 1 for red and 0 for blue,
+# codec.decode_array plus codec.cell_fields gives one from urls (hidden cells keep their solution color).
+# Every function gives the same answers as the per board methods named in its docstring
+
+# the eight neighbour offsets as (dy, dx)
+_OFFSETS = tuple((dy, dx) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dy or dx)
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("numpy is needed for the grid functions, the per board methods work without it")
+
+
+def grids_from_boards(boards: Iterable[Board]) -> "np.ndarray":
+    """(N, height, width) uint8 grid of fully colored boards of one shape"""
+    _require_numpy()
+    return np.array([[[1 if sq.color == RED else 0 for sq in row.cells] for row in board.rows] for board in boards],
+                    dtype=np.uint8)
+
+
+def grid_numbers(grids: "np.ndarray") -> "np.ndarray":
+    """
+    The clue of every cell, how many of its up to eight neighbours have its color, as an int8 array shaped like grids.
+    Board.fill_numbers for the whole stack, summed over eight shifted copies of the grid padded with a value
+    that matches neither color
+    """
+    _require_numpy()
+    n, height, width = grids.shape
+    padded = np.full((n, height + 2, width + 2), 2, dtype=np.uint8)
+    padded[:, 1:-1, 1:-1] = grids
+    numbers = np.zeros(grids.shape, dtype=np.int8)
+    for dy, dx in _OFFSETS:
+        numbers += padded[:, 1 + dy:1 + dy + height, 1 + dx:1 + dx + width] == grids
+    return numbers
+
+
+def line_balance(grids: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    (rows, columns) boolean arrays shaped (N, height) and (N, width), True where no color fills more
+    than half the line rounded up, Line.check_color_count on every full line
+    """
+    _require_numpy()
+    _, height, width = grids.shape
+    row_reds = grids.sum(axis=2, dtype=np.int32)
+    column_reds = grids.sum(axis=1, dtype=np.int32)
+    row_max = math.ceil(width / 2)
+    column_max = math.ceil(height / 2)
+    return ((row_reds <= row_max) & (width - row_reds <= row_max),
+            (column_reds <= column_max) & (height - column_reds <= column_max))
+
+
+def identical_lines(grids: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    (rows, columns) boolean arrays shaped (N, height - 1) and (N, width - 1), True where a line is colored
+    exactly like the next one, the opposite of lines.lines_different. Line.__eq__ isnt used as the reference
+    since its cmp_key can call an odd length line equal to its own inverse
+    """
+    _require_numpy()
+    return ((grids[:, 1:, :] == grids[:, :-1, :]).all(axis=2),
+            (grids[:, :, 1:] == grids[:, :, :-1]).all(axis=1))
+
+
+def valid_grids(grids: "np.ndarray", identical_checks=False) -> "np.ndarray":
+    """
+    (N,) boolean, whether every row and column is balanced and with identical_checks also that
+    no two neighbouring lines are the same. The generator doesnt enforce the second rule, so it is off by default
+    """
+    _require_numpy()
+    rows, columns = line_balance(grids)
+    valid = rows.all(axis=1) & columns.all(axis=1)
+    if identical_checks:
+        same_rows, same_columns = identical_lines(grids)
+        valid &= ~same_rows.any(axis=1) & ~same_columns.any(axis=1)
+    return valid
+
+
+def numbers_match(grids: "np.ndarray", numbers: "np.ndarray") -> "np.ndarray":
+    """
+    (N,) boolean, whether every shown number (numbers as codec.cell_fields gives them, -1 for none)
+    is the clue grid_numbers works out for that cell, a corpus wide check that puzzles werent corrupted
+    """
+    _require_numpy()
+    shown = numbers >= 0
+    return ((grid_numbers(grids) == numbers) | ~shown).all(axis=(1, 2))
@@ -1,38 +1,45 @@
 import math
 
-from typing import List, Literal
+from typing import Dict, List, Tuple
 
-from cell import Cell
+from cell import Cell, Color, RED, BLUE
+
+_line_patterns: Dict[int, Tuple[int, ...]] = {}
 
 class Line:
     """Row and Columns are at their heart the same thing, so both direct into this parent class which does all the calculations"""
     attribute_name = None   # overrided in subclasses to be either .row or .column
-    cells: List[Cell] = []
+    __slots__ = ("cells", "color_count", "red_count", "blue_count", "known_mask", "red_mask", "allowed_size")
 
     def __init__(self, value):
         cells = []
         self.color_count = 0
         self.cells: List[Cell] = []
+        self.red_count = 0
+        self.blue_count = 0
+        # bit i is cells[i], kept up to date by Cell.write like the counters
+        self.known_mask = 0
+        self.red_mask = 0
 
     def _cmp_key(self):
         """
         Lowkey a mess of a method honestly, just ignore it
         """
-        colors: List[Literal["red", "blue"]] = []
+        colors: List[Color] = []
         for cell in self.cells:
             color = cell.get_color()
             if color is None:
                 return None
             colors.append(color)
 
-        red_count = colors.count("red")
-        blue_count = colors.count("blue")
+        red_count = colors.count(RED)
+        blue_count = colors.count(BLUE)
 
         if self.color_count is not None and red_count == self.color_count:
-            return tuple(i for i, c in enumerate(colors) if c == "red")
+            return tuple(i for i, c in enumerate(colors) if c == RED)
 
         if self.color_count is not None and blue_count == self.color_count:
-            return tuple(i for i, c in enumerate(colors) if c == "blue")
+            return tuple(i for i, c in enumerate(colors) if c == BLUE)
 
         return tuple(colors)
 
@@ -53,10 +60,9 @@ class Line:
 
     def check_color_count(self):
         """makes sure there are maximum of allowed_size colors in a row"""
-        red, blue, uncolored = self.count_colors()
-        if blue > self.color_count:
+        if self.blue_count > self.color_count:
             return False
-        elif red > self.color_count:
+        elif self.red_count > self.color_count:
             return False
         return True
 
@@ -65,35 +71,38 @@ class Line:
         return self.cells
 
     def count_colors(self):
-        """Gets the color count of the row, kinda depricated because you can use get_color_counts(row.row) or get_color_counts(column.column)"""
-        red = 0
-        blue = 0
-        uncolored = 0
-        # iterate the actual square objects
-        for square in self.get_cells():
-            if square.get_color() == "blue":
-                blue += 1
-            elif square.get_color() == "red":
-                red += 1
-            else:
-                uncolored += 1
-        return red, blue, uncolored
+        """Gets the visible color count of the row, red_count and blue_count are kept up to date by Cell.write so this doesnt rescan"""
+        return self.red_count, self.blue_count, len(self.cells) - self.red_count - self.blue_count
+
+    def solve(self) -> Tuple[int, int] | None:
+        """The line's (known, red) masks with the rest filled in once a color is half full, None if a color is past half"""
+        return solve_line(len(self.cells), self.known_mask, self.red_mask)
 
 class UrjoRow(Line):
     """row object inheriting directly from the rowcolumn parent"""
     attribute_name = "row"
+    __slots__ = ("row",)
     def __init__(self, value):
         setattr(self, self.attribute_name, value)
         self.allowed_size = None
         self.cells = value
+        self.red_count = 0
+        self.blue_count = 0
+        self.known_mask = 0
+        self.red_mask = 0
 
 class UrjoColumn(Line):
     """column object inheriting directly from the rowcolumn parent"""
     attribute_name = "column"
+    __slots__ = ("column",)
     def __init__(self, value):
         setattr(self, self.attribute_name, value)
         self.allowed_size = None
         self.cells = value
+        self.red_count = 0
+        self.blue_count = 0
+        self.known_mask = 0
+        self.red_mask = 0
 
 def get_color_counts(slots: List[Cell | None]):
     """counts each color in the provided slots"""
@@ -102,9 +111,9 @@ def get_color_counts(slots: List[Cell | None]):
     uncolored = 0
     for slot in slots:
         if slot is not None:
-            if slot.get_color() == "red":
+            if slot.get_color() == RED:
                 red +=1
-            if slot.get_color() == "blue":
+            if slot.get_color() == BLUE:
                 blue +=1
             if slot.get_color() == None:
                 uncolored +=1
@@ -133,4 +142,32 @@ def check_row_and_column(cell: Cell):
         raise Exception("Cannot use check_row_and_column on a sole cell!")
     if cell.row.check_color_count() and cell.column.check_color_count():
         return True
-    return False
\ No newline at end of file
+    return False
+
+def line_patterns(length: int) -> Tuple[int, ...]:
+    """Every valid coloring of a line as a red bitmask (no color more than half full), cached per length"""
+    patterns = _line_patterns.get(length)
+    if patterns is None:
+        max = math.ceil(length / 2)
+        patterns = tuple(p for p in range(1 << length) if length - max <= p.bit_count() <= max)
+        _line_patterns[length] = patterns
+    return patterns
+
+def solve_line(length: int, known: int, red: int) -> Tuple[int, int] | None:
+    """
+    The new (known, red) masks of a line with every cell the half full rule forces added, None if the line is already broken.
+    Intersecting every fitting pattern from line_patterns forces exactly this, once a color is half full
+    the rest of the line is the other one and otherwise every unknown cell can still be either, so counting is enough
+    """
+    red &= known
+    full = (1 << length) - 1
+    max = math.ceil(length / 2)
+    red_count = red.bit_count()
+    blue_count = known.bit_count() - red_count
+    if red_count > max or blue_count > max:
+        return None
+    if red_count == max:
+        return full, red
+    if blue_count == max:
+        return full, red | (full & ~known)
+    return known, red
@@ -1,23 +1,85 @@
-from generator import UrjoGenerator
+from batch import generate_batch, PuzzleResult, Rejection
+from stream import PuzzleStreamWriter, read_records
+from dedup import PuzzleDeduper
 
+import argparse
 import time
-import json
 import os
 
+parser = argparse.ArgumentParser(description="Generates Urjo puzzles into output/<timestamp>.NNNN.jsonl, one puzzle per line")
+parser.add_argument("--width", type=int, default=8)
+parser.add_argument("--height", type=int, default=8)
+parser.add_argument("--numbers", type=int, default=5, help="number_of_numbers passed to create_puzzle")
+parser.add_argument("--contradictions", type=int, default=2, help="contradiction_count passed to create_puzzle")
+parser.add_argument("--bitboard", action="store_true", help="run the uncoloring on the bitboard kernel")
+parser.add_argument("--uniform", action="store_true", help="draw solution grids uniformly instead of by backtracking, boards too big to count (past about 10x12) still backtrack")
+parser.add_argument("--cache-size", type=int, default=None, help="turn on the can_be_color transposition cache with this many entries")
+parser.add_argument("--order", choices=["random", "constrained"], default="random",
+                    help="which cells the contradiction search tries first, the puzzles are the same either way")
+parser.add_argument("--schedule", choices=["single", "tiered"], default="single",
+                    help="tiered removes the cells propagation finds before searching deeper, see uncolor_board")
+parser.add_argument("--deadline", type=float, default=None, help="give a puzzle up after this many seconds")
+parser.add_argument("--max-steps", type=int, default=None, help="give a puzzle up after this many can_be_color searches")
+parser.add_argument("--min-contradictions", type=int, default=0,
+                    help="give a puzzle up as soon as it cant end with this many contradictions")
+parser.add_argument("--project-after", type=float, default=None,
+                    help="also give it up once this fraction of cells is done and the rate so far wont reach --min-contradictions")
+parser.add_argument("--verify-unique", action="store_true",
+                    help="prove every puzzle has one solution with the solver and give it up if it doesnt")
+parser.add_argument("--dedup", choices=["bloom", "exact", "none"], default="bloom",
+                    help="drop puzzles that are a rotation, reflection or red/blue swap of one already written, "
+                         "bloom has fixed memory, exact keeps 16 bytes plus set overhead for every puzzle ever seen")
+parser.add_argument("--dedup-capacity", type=int, default=10_000_000, help="puzzles the bloom filter is sized for")
+parser.add_argument("--dedup-error-rate", type=float, default=1e-6,
+                    help="chance the bloom filter drops a new puzzle as a duplicate")
+parser.add_argument("--dedup-against", nargs="*", default=[],
+                    help="output bases of earlier runs (like output/1700000000) whose puzzles count as already written")
+parser.add_argument("--per-grid", type=int, default=1, help="how many puzzles to make out of each solved grid")
+parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+parser.add_argument("--count", type=int, default=None,
+                    help="how many puzzles to write, duplicates dropped dont count, runs until ctrl+c if not given")
+parser.add_argument("--seed", type=int, default=None, help="base seed, the same seed and worker count gives the same puzzles")
+parser.add_argument("--sync-every", type=int, default=100, help="fsync after this many puzzles")
+parser.add_argument("--sync-interval", type=float, default=5.0, help="fsync at least this often, in seconds")
+parser.add_argument("--max-mb", type=float, default=64, help="start a new output file after this many megabytes")
+parser.add_argument("--max-records", type=int, default=None, help="start a new output file after this many puzzles")
+args = parser.parse_args()
+
 ts = round(time.time())
+seed = args.seed if args.seed is not None else ts
 
 if not "output" in os.listdir("."):
     os.mkdir("./output")
 
-generated = []
+deduper = None
+if args.dedup != "none":
+    deduper = PuzzleDeduper(args.dedup, args.dedup_capacity, args.dedup_error_rate)
+    for base in args.dedup_against:
+        print(f"{deduper.add_records(read_records(base))} puzzles from {base}")
+
+writer = PuzzleStreamWriter(f"output/{ts}", sync_every=args.sync_every, sync_interval=args.sync_interval,
+                            max_bytes=round(args.max_mb * 1024 * 1024), max_records=args.max_records)
 
-while True:
-        generator = UrjoGenerator()
-        generated_board = generator.create_puzzle(8, 8, number_of_numbers=5, contradiction_count=2)
-        generated.append([generated_board.to_url_format(), generated_board.contradiction_count])
+def write(result: PuzzleResult) -> bool:
+    if deduper is not None and not deduper.add(result.url, args.width, args.height):
+        print("duplicate:", result.url)
+        return False
+    writer.write({"url": result.url, "width": args.width, "height": args.height,
+                  "contradiction_count": result.contradiction_count, "seconds": round(result.seconds, 3)})
+    print(result.url, result.contradiction_count, f"{result.seconds:.2f}s")
+    return True
 
-        with (open(f"output/{ts}.json", "x" if not f"{ts}.json" in os.listdir("./output") else "w")) as file:
-            file.write(json.dumps(generated, indent=4))
+def rejected(rejection: Rejection):
+    print("rejected:", rejection.reason, f"{rejection.seconds:.2f}s")
 
-        print(generated_board.to_url_format(), generated_board.contradiction_count)
-        
\ No newline at end of file
+params = dict(dim1=args.width, dim2=args.height, number_of_numbers=args.numbers,
+              contradiction_count=args.contradictions, bitboard=args.bitboard, cache_size=args.cache_size,
+              uniform_grid=args.uniform, candidate_order=args.order, schedule=args.schedule,
+              deadline=args.deadline, max_steps=args.max_steps, min_contradictions=args.min_contradictions,
+              project_after=args.project_after, verify_unique=args.verify_unique)
+print(f"seed {seed}, {args.workers} workers")
+with writer:
+    generate_batch(params, write, workers=args.workers, target=args.count, seed=seed, per_grid=args.per_grid,
+                   on_reject=rejected)
+if deduper is not None:
+    print(f"{deduper.duplicates} duplicates dropped")
@@ -0,0 +1,39 @@
+from typing import Callable, Dict, List, Sequence, TypeVar
+
+T = TypeVar("T")
+
+# the contradiction search never looks at more candidates than this per level
+SAMPLE_LIMIT = 10000
+
+type CandidateOrder[T] = Callable[[Sequence[T], object, Callable[[T], object]], List[T]]
+
+
+def random_order(candidates: Sequence[T], rng, score: Callable[[T], object]) -> List[T]:
+    """Up to SAMPLE_LIMIT candidates in random order, the original behaviour"""
+    k = min(SAMPLE_LIMIT, len(candidates))
+    return rng.sample(candidates, k) if k > 0 else []
+
+
+def constrained_order(candidates: Sequence[T], rng, score: Callable[[T], object]) -> List[T]:
+    """
+    Most constrained candidates first, by score (lower is tried sooner), ties stay in random order.
+    Draws from rng the same way random_order does (up to SAMPLE_LIMIT candidates), so switching strategies doesnt move the rest of the search
+    """
+    shuffled = rng.sample(candidates, len(candidates)) if candidates else []
+    shuffled.sort(key=score)
+    return shuffled[:SAMPLE_LIMIT]
+
+
+CANDIDATE_ORDERS: Dict[str, CandidateOrder] = {
+    "random": random_order,
+    "constrained": constrained_order,
+}
+
+
+def get_candidate_order(order: str | CandidateOrder) -> CandidateOrder:
+    """Looks a strategy up by name, a callable is passed straight through"""
+    if callable(order):
+        return order
+    if order not in CANDIDATE_ORDERS:
+        raise ValueError(f"Unknown candidate order '{order}', expected one of {', '.join(CANDIDATE_ORDERS)}")
+    return CANDIDATE_ORDERS[order]
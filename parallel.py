@@ -0,0 +1,101 @@
+import math
+import multiprocessing as mp
+import random
+import signal
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import List, Tuple
+
+from bitboard import BitBoard
+from budget import Budget
+
+# the kernel a pool process keeps between tasks, rebuilt only when the shape or numbers change
+_kernel: BitBoard | None = None
+_kernel_key: Tuple | None = None
+# bumped by the parent to cancel whatever is still running
+_generation = None
+
+
+def _init_worker(generation):
+    global _generation
+    # ctrl+c is the parent's business, it shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _generation = generation
+
+
+def _evaluate(generation: int, width: int, height: int, numbers: Tuple[int | None, ...],
+              state: Tuple[Tuple[int, ...], Tuple[int, ...]], candidates: List[int], contradiction_count: int,
+              original_contradiction: int, number_checks: bool, row_checks: bool, line_checks: bool) -> int | None:
+    """Runs in a pool process, returns the first candidate that can be neither color, None if there isnt one"""
+    global _kernel, _kernel_key
+    key = (width, height, numbers)
+    if _kernel_key != key:
+        _kernel = BitBoard(width, height)
+        _kernel.numbers = list(numbers)
+        _kernel_key = key
+    kernel = _kernel
+    kernel.load_state(*state)
+    # which order the inner searches sample in never changes their answer
+    kernel.random = random.Random(generation)
+
+    return kernel.first_contradiction(candidates, contradiction_count, original_contradiction,
+                                      number_checks, row_checks, line_checks,
+                                      stop=lambda: _generation.value != generation)
+
+
+class CandidatePool():
+    """
+    Process pool that tries the top level contradiction candidates of one search in parallel.
+    Every task gets the bitboard's masks and a slice of the candidates, and as soon as one slice finds a
+    contradiction the rest are cancelled. The answer is the same as trying them one after another,
+    only which contradiction gets found first can differ
+    """
+
+    def __init__(self, workers: int, min_candidates: int = 16, chunks_per_worker: int = 4):
+        self.workers = workers
+        # below this many candidates the pickling costs more than it saves
+        self.min_candidates = min_candidates
+        self.chunks_per_worker = chunks_per_worker
+        ctx = mp.get_context()
+        self.generation = ctx.Value("q", 0, lock=False)
+        self.executor = ProcessPoolExecutor(workers, mp_context=ctx, initializer=_init_worker,
+                                            initargs=(self.generation,))
+
+    def first_contradiction(self, kernel: BitBoard, candidates: List[int], contradiction_count: int,
+                            original_contradiction: int, number_checks=True, row_checks=True, line_checks=False,
+                            budget: Budget | None = None) -> bool:
+        """Whether any candidate can be neither color on kernel's current position, searched contradiction_count deep"""
+        self.generation.value += 1
+        generation = self.generation.value
+        state = kernel.state()
+        numbers = tuple(kernel.numbers)
+        size = max(1, math.ceil(len(candidates) / (self.workers * self.chunks_per_worker)))
+        pending = {
+            self.executor.submit(_evaluate, generation, kernel.width, kernel.height, numbers, state,
+                                 candidates[i:i + size], contradiction_count, original_contradiction,
+                                 number_checks, row_checks, line_checks)
+            for i in range(0, len(candidates), size)
+        }
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+                if any(future.result() is not None for future in done):
+                    return True
+                if budget is not None:
+                    budget.check()
+            return False
+        finally:
+            if pending:
+                # stops the running slices at their next candidate, queued ones never start
+                self.generation.value += 1
+                for future in pending:
+                    future.cancel()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
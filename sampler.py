@@ -0,0 +1,129 @@
+import math
+import random
+
+from typing import Dict, List, Tuple
+
+from lines import line_patterns
+
+# the most work (see table_work) a sampler may take to build, a second or so, 10x12 and 8x16 fit.
+# Bigger shapes use fill_board_backtracking
+SAMPLER_WORK_LIMIT = 5_000_000
+
+_samplers: Dict[Tuple[int, int], "GridSampler"] = {}
+
+
+def table_work(width: int, height: int) -> int:
+    """
+    An upper bound on the work of building a shape's tables, the sorted column counts a row can end with
+    times the row patterns tried from each (plus what a state costs on its own), summed over the rows.
+    Grows with both sides, the long side sets how many rows there are and how far apart the counts of one row can be
+    """
+    length = min(width, height)
+    depth = max(width, height)
+    line_max = math.ceil(length / 2)
+    column_max = math.ceil(depth / 2)
+    column_min = depth - column_max
+    patterns = sum(math.comb(length, k) for k in range(length - line_max, line_max + 1))
+    states = 0
+    for row in range(1, depth + 1):
+        values = min(row, column_max) - max(0, column_min - (depth - row)) + 1
+        states += math.comb(length + values - 1, length)
+    return states * (patterns + 32)
+
+
+def sampler_fits(width: int, height: int) -> bool:
+    """whether a GridSampler for the shape is cheap enough to build"""
+    return table_work(width, height) <= SAMPLER_WORK_LIMIT
+
+
+class GridSampler():
+    """
+    Draws solved grids uniformly at random for one board shape with a transfer matrix over rows.
+    The state after some rows is how many reds each column has so far, and since every row pattern
+    is allowed in any column order only the sorted counts matter, which keeps the table small.
+    The completion counts are worked out once and reused for every grid drawn
+    """
+
+    def __init__(self, width: int, height: int):
+        # rows run along the shorter side, a tall board is sampled on its side and transposed back
+        self.width = width
+        self.height = height
+        self.transposed = width > height
+        self.length = min(width, height)
+        self.depth = max(width, height)
+        if not sampler_fits(width, height):
+            raise ValueError(f"GridSampler tables for {width}x{height} are too big to build, see SAMPLER_WORK_LIMIT")
+
+        self.patterns = line_patterns(self.length)
+        self.pattern_bits = [tuple(p >> i & 1 for i in range(self.length)) for p in self.patterns]
+        # how many reds a finished column can have
+        self.column_max = math.ceil(self.depth / 2)
+        self.column_min = self.depth - self.column_max
+        self.counts: Dict[Tuple[int, Tuple[int, ...]], int] = {}
+        self.total = self.build()
+
+    def next_states(self, row: int, state: Tuple[int, ...]):
+        """the (row pattern, column counts after it) pairs that can still be finished, state sorted or not"""
+        rows_left = self.depth - row - 1
+        for bits in self.pattern_bits:
+            new_state = tuple(c + b for c, b in zip(state, bits))
+            if all(self.column_min - rows_left <= c <= self.column_max for c in new_state):
+                yield bits, new_state
+
+    def build(self) -> int:
+        """
+        Fills counts for every reachable state, a pass down the rows to find them and one back up to count,
+        so a long board doesnt recurse once per row. Returns how many grids there are
+        """
+        # per row, every state and how many patterns lead from it to each next one
+        levels = [{(0,) * self.length: None}]
+        for row in range(self.depth):
+            following = {}
+            for state in levels[row]:
+                moves: Dict[Tuple[int, ...], int] = {}
+                for _, new_state in self.next_states(row, state):
+                    new_state = tuple(sorted(new_state))
+                    moves[new_state] = moves.get(new_state, 0) + 1
+                    following[new_state] = None
+                levels[row][state] = moves
+            levels.append(following)
+        for row in range(self.depth - 1, -1, -1):
+            for state, moves in levels[row].items():
+                self.counts[(row, state)] = sum(ways * self.count(row + 1, new_state) for new_state, ways in moves.items())
+        return self.count(0, (0,) * self.length)
+
+    def count(self, row: int, state: Tuple[int, ...]) -> int:
+        """How many ways the rows from row onwards can be filled given the column red counts in state"""
+        if row == self.depth:
+            return 1
+        return self.counts[(row, tuple(sorted(state)))]
+
+    def sample(self, rng=random) -> List[List[bool]]:
+        """One grid as rows of booleans (True is red), height rows of width cells, every valid grid equally likely"""
+        if self.total == 0:
+            raise ValueError("Unable to color board with current constraints")
+
+        state = (0,) * self.length
+        lines = []
+        for row in range(self.depth):
+            pick = rng.randrange(self.count(row, state))
+            for bits, new_state in self.next_states(row, state):
+                weight = self.count(row + 1, new_state)
+                if pick < weight:
+                    break
+                pick -= weight
+            lines.append(bits)
+            state = new_state
+
+        if self.transposed:
+            return [[bool(lines[x][y]) for x in range(self.width)] for y in range(self.height)]
+        return [[bool(b) for b in bits] for bits in lines]
+
+
+def get_sampler(width: int, height: int) -> GridSampler:
+    """The cached sampler for a board shape, so the tables are only built once per shape"""
+    sampler = _samplers.get((width, height))
+    if sampler is None:
+        sampler = GridSampler(width, height)
+        _samplers[(width, height)] = sampler
+    return sampler
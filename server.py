@@ -0,0 +1,324 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import time
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Deque, Dict, List, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from batch import PuzzleResult, Rejection
+from board import BoardPool
+from budget import PuzzleRejected
+from generator import UrjoGenerator
+
+# (dim1, dim2, number_of_numbers, contradiction_count), the create_puzzle inputs a client can pick
+type Bucket = Tuple[int, int, int, int]
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+# the generator a pool process keeps between puzzles, with a board per bucket shape that is reset in place every time
+_generator: UrjoGenerator | None = None
+
+
+def _init_worker():
+    global _generator
+    # ctrl+c is the server's business, it shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # buckets of every shape land on the same process, so the boards of the other shapes wait in the pool
+    _generator = UrjoGenerator(board_pool=BoardPool())
+
+
+def _generate(bucket: Bucket, params: Dict[str, Any], seed: int) -> PuzzleResult | Rejection:
+    """Runs in a pool process, one puzzle for bucket seeded with seed so it can be made again"""
+    random.seed(seed)
+    start = time.perf_counter()
+    dim1, dim2, numbers, contradictions = bucket
+    try:
+        board = _generator.create_puzzle(dim1=dim1, dim2=dim2, number_of_numbers=numbers,
+                                         contradiction_count=contradictions, **params)
+    except PuzzleRejected as rejected:
+        return Rejection(rejected.reason, time.perf_counter() - start, os.getpid())
+    return PuzzleResult(board.to_url_format(), board.contradiction_count, time.perf_counter() - start, os.getpid())
+
+
+def parse_bucket(text: str) -> Bucket:
+    """WIDTHxHEIGHT:NUMBERS:CONTRADICTIONS, like 8x8:5:2"""
+    try:
+        size, numbers, contradictions = text.split(":")
+        width, height = size.lower().split("x")
+        return int(width), int(height), int(numbers), int(contradictions)
+    except ValueError:
+        raise ValueError(f"Bad bucket '{text}', expected WIDTHxHEIGHT:NUMBERS:CONTRADICTIONS like 8x8:5:2") from None
+
+
+def percentiles(samples: Sequence[float], points: Sequence[int] = (50, 90, 99)) -> Dict[str, float | None]:
+    """Nearest rank percentiles of samples, None when there are none yet"""
+    ordered = sorted(samples)
+    result: Dict[str, float | None] = {}
+    for point in points:
+        if not ordered:
+            result[f"p{point}"] = None
+            continue
+        rank = max(0, min(len(ordered) - 1, -(-point * len(ordered) // 100) - 1))
+        result[f"p{point}"] = ordered[rank]
+    return result
+
+
+class BucketPool():
+    """
+    The ready puzzles of one bucket plus what the refill scheduler needs to know about it,
+    how fast it is being drained and how many puzzles for it are already being made
+    """
+
+    def __init__(self, bucket: Bucket, capacity: int, window: float = 60.0, samples: int = 10000):
+        self.bucket = bucket
+        self.capacity = capacity
+        # drain rate is measured over the last window seconds
+        self.window = window
+        self.ready: Deque[PuzzleResult] = deque()
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.in_flight = 0
+        self.taken: Deque[float] = deque()
+        self.latencies: Deque[float] = deque(maxlen=samples)
+        self.generation: Deque[float] = deque(maxlen=samples)
+        self.served = 0
+        self.generated = 0
+        self.rejected = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    def drain_rate(self, now: float) -> float:
+        """puzzles taken per second over the last window"""
+        while self.taken and self.taken[0] < now - self.window:
+            self.taken.popleft()
+        return len(self.taken) / self.window
+
+    def wanted(self) -> bool:
+        """whether another puzzle should be started, past capacity only for clients already waiting"""
+        return len(self.ready) + self.in_flight < self.capacity + len(self.waiters)
+
+    def urgency(self, now: float) -> float:
+        """
+        Seconds until the pool runs dry at the current drain rate counting what is being made, lower is refilled first.
+        Negative once more clients are waiting than there are puzzles coming. A pool nobody uses still drains
+        at one puzzle a window, so idle pools fill up too, the emptiest first
+        """
+        rate = max(self.drain_rate(now), 1 / self.window)
+        return (len(self.ready) + self.in_flight - len(self.waiters)) / rate
+
+    def put(self, result: PuzzleResult):
+        self.generated += 1
+        self.generation.append(result.seconds)
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            # a waiter that timed out is already done
+            if not waiter.done():
+                waiter.set_result(result)
+                return
+        self.ready.append(result)
+
+    async def take(self, timeout: float) -> PuzzleResult:
+        """the oldest ready puzzle, waiting up to timeout seconds for one if the pool is empty"""
+        self.taken.append(time.monotonic())
+        if self.ready:
+            return self.ready.popleft()
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    def metrics(self, now: float) -> Dict[str, Any]:
+        width, height, numbers, contradictions = self.bucket
+        return {
+            "width": width, "height": height, "numbers": numbers, "contradictions": contradictions,
+            "depth": len(self.ready), "capacity": self.capacity, "in_flight": self.in_flight,
+            "waiting": len(self.waiters), "drain_per_minute": round(self.drain_rate(now) * 60, 2),
+            "served": self.served, "generated": self.generated, "rejected": self.rejected,
+            "errors": self.errors, "timeouts": self.timeouts,
+            "latency_ms": {k: None if v is None else round(v * 1000, 3) for k, v in percentiles(self.latencies).items()},
+            "generation_seconds": {k: None if v is None else round(v, 3) for k, v in percentiles(self.generation).items()},
+        }
+
+
+class PuzzleServer():
+    """
+    Serves puzzles out of a bounded pool per bucket over http, on tcp or a unix socket.
+    A process pool of UrjoGenerators refills the pools in the background, the one closest to running dry first
+    (see BucketPool.urgency), so a request only waits on create_puzzle when its bucket is drained faster
+    than the workers can keep up.
+
+    GET /puzzle?width=8&height=8&numbers=5&contradictions=2 returns one puzzle as json,
+    GET /metrics the pool depths, drain rates and latency percentiles of every bucket
+    """
+
+    def __init__(self, buckets: List[Bucket], params: Dict[str, Any] | None = None, workers: int = 1,
+                 capacity: int = 32, seed: int | None = None, timeout: float = 30.0):
+        self.pools = {bucket: BucketPool(bucket, capacity) for bucket in buckets}
+        # create_puzzle options shared by every bucket
+        self.params = params or {}
+        self.workers = workers
+        self.timeout = timeout
+        # every puzzle is seeded from this, which bucket gets which seed depends on the traffic
+        self.random = random.Random(seed)
+        self.executor: ProcessPoolExecutor | None = None
+        self.in_flight = 0
+        self.started = time.monotonic()
+        self.wake: asyncio.Event | None = None
+
+    def next_pool(self) -> BucketPool | None:
+        now = time.monotonic()
+        wanted = [pool for pool in self.pools.values() if pool.wanted()]
+        return min(wanted, key=lambda pool: pool.urgency(now)) if wanted else None
+
+    async def refill(self):
+        """keeps every worker busy on the most urgent bucket until cancelled"""
+        loop = asyncio.get_running_loop()
+        while True:
+            while self.in_flight < self.workers and (pool := self.next_pool()) is not None:
+                self.in_flight += 1
+                pool.in_flight += 1
+                future = loop.run_in_executor(self.executor, _generate, pool.bucket, self.params,
+                                              self.random.getrandbits(64))
+                future.add_done_callback(partial(self.finished, pool))
+            self.wake.clear()
+            await self.wake.wait()
+
+    def finished(self, pool: BucketPool, future: asyncio.Future):
+        self.in_flight -= 1
+        pool.in_flight -= 1
+        self.wake.set()
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            pool.errors += 1
+            print(f"generating {pool.bucket} failed:", repr(future.exception()))
+            return
+        result = future.result()
+        if isinstance(result, Rejection):
+            pool.rejected += 1
+        else:
+            pool.put(result)
+
+    async def get_puzzle(self, query: Dict[str, List[str]]) -> Tuple[int, Dict[str, Any], BucketPool | None]:
+        """status, json body and the pool it came from"""
+        try:
+            bucket = tuple(int(query[name][0]) for name in ("width", "height", "numbers", "contradictions"))
+        except (KeyError, ValueError):
+            return 400, {"error": "width, height, numbers and contradictions are all needed as integers"}, None
+        pool = self.pools.get(bucket)
+        if pool is None:
+            return 404, {"error": f"no pool for {bucket}",
+                         "buckets": [f"{w}x{h}:{n}:{c}" for w, h, n, c in self.pools]}, None
+        self.wake.set()
+        try:
+            result = await pool.take(self.timeout)
+        except asyncio.TimeoutError:
+            pool.timeouts += 1
+            return 503, {"error": f"no puzzle ready within {self.timeout}s"}, pool
+        pool.served += 1
+        return 200, {"url": result.url, "width": bucket[0], "height": bucket[1],
+                     "contradiction_count": result.contradiction_count, "seconds": round(result.seconds, 3)}, pool
+
+    def metrics(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {"uptime": round(now - self.started, 1), "workers": self.workers, "in_flight": self.in_flight,
+                "buckets": [pool.metrics(now) for pool in self.pools.values()]}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """one request per connection, the headers are read and ignored"""
+        start = time.perf_counter()
+        pool = None
+        try:
+            try:
+                method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+                while (await reader.readline()).strip():
+                    pass
+            except ValueError:
+                status, body = 400, {"error": "bad request line"}
+            else:
+                url = urlsplit(target)
+                if method != "GET":
+                    status, body = 405, {"error": "only GET is supported"}
+                elif url.path == "/puzzle":
+                    status, body, pool = await self.get_puzzle(parse_qs(url.query))
+                elif url.path == "/metrics":
+                    status, body = 200, self.metrics()
+                else:
+                    status, body = 404, {"error": f"no such path {url.path}, try /puzzle or /metrics"}
+
+            payload = json.dumps(body, separators=(",", ":")).encode()
+            writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                         f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+            if pool is not None:
+                pool.latencies.append(time.perf_counter() - start)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def run(self, host="127.0.0.1", port=8080, unix: str | None = None):
+        """serves until SIGINT or SIGTERM, then drops the queued puzzles and waits for the ones being made"""
+        loop = asyncio.get_running_loop()
+        self.wake = asyncio.Event()
+        self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker)
+        refill = asyncio.create_task(self.refill())
+        if unix is not None:
+            server = await asyncio.start_unix_server(self.handle, path=unix)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        print("serving on", unix or f"http://{host}:{port}", "buckets",
+              " ".join(f"{w}x{h}:{n}:{c}" for w, h, n, c in self.pools))
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            refill.cancel()
+            try:
+                await refill
+            except asyncio.CancelledError:
+                pass
+            # queued puzzles are dropped, the ones being made are waited for (off the loop, their callbacks still run on it)
+            # so the executor's manager thread is gone before the interpreter tears down
+            await asyncio.to_thread(self.executor.shutdown, wait=True, cancel_futures=True)
+            if unix is not None and os.path.exists(unix):
+                os.unlink(unix)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serves pre-generated Urjo puzzles over http from a pool per bucket")
+    parser.add_argument("--bucket", action="append", type=parse_bucket, default=None,
+                        help="WIDTHxHEIGHT:NUMBERS:CONTRADICTIONS to keep a pool of, can be repeated, 8x8:5:2 if not given")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix", default=None, help="listen on this unix socket instead of tcp")
+    parser.add_argument("--pool-size", type=int, default=32, help="ready puzzles kept per bucket")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--timeout", type=float, default=30.0, help="how long a request waits on an empty pool")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--bitboard", action="store_true", help="run the uncoloring on the bitboard kernel")
+    parser.add_argument("--uniform", action="store_true", help="draw solution grids uniformly instead of by backtracking")
+    parser.add_argument("--cache-size", type=int, default=None, help="turn on the can_be_color transposition cache with this many entries")
+    parser.add_argument("--deadline", type=float, default=None, help="give a puzzle up after this many seconds")
+    parser.add_argument("--max-steps", type=int, default=None, help="give a puzzle up after this many can_be_color searches")
+    parser.add_argument("--verify-unique", action="store_true",
+                        help="prove every puzzle has one solution with the solver and give it up if it doesnt")
+    args = parser.parse_args()
+
+    params = dict(bitboard=args.bitboard, uniform_grid=args.uniform, cache_size=args.cache_size,
+                  deadline=args.deadline, max_steps=args.max_steps, verify_unique=args.verify_unique)
+    server = PuzzleServer(args.bucket or [(8, 8, 5, 2)], params, workers=args.workers, capacity=args.pool_size,
+                          seed=args.seed, timeout=args.timeout)
+    asyncio.run(server.run(args.host, args.port, args.unix))
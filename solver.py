@@ -0,0 +1,356 @@
+import argparse
+import json
+import multiprocessing as mp
+import sys
+
+from collections import deque
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Tuple
+
+from board import Board
+from bitboard import BitBoard
+from budget import Budget, PuzzleRejected
+
+
+def propagate(bitboard: BitBoard, number_checks=True, changed: Iterable[int] | None = None) -> bool:
+    """
+    Applies the line rule and the number rule to the whole board until nothing changes anymore.
+    Returns False as soon as some line or number cant be satisfied, the writes stay on the trail either way
+    so take a mark first if they need undoing.
+    If the board was already propagated, changed (the cells set since) starts from just the lines and numbers they touch
+    """
+    width = bitboard.width
+    height = bitboard.height
+    numbers = bitboard.numbers
+    neighbours = bitboard.neighbours
+
+    if changed is None:
+        rows = deque(range(height))
+        columns = deque(range(width))
+        dirty_numbers = deque(i for i, n in enumerate(numbers) if n is not None) if number_checks else deque()
+    else:
+        rows = deque()
+        columns = deque()
+        dirty_numbers = deque()
+    queued_rows = set(rows)
+    queued_columns = set(columns)
+    queued_numbers = set(dirty_numbers)
+
+    def touched(changed):
+        """queues up everything a changed cell can affect"""
+        for index in changed:
+            y, x = divmod(index, width)
+            if y not in queued_rows:
+                queued_rows.add(y)
+                rows.append(y)
+            if x not in queued_columns:
+                queued_columns.add(x)
+                columns.append(x)
+            if number_checks:
+                for n in (index,) + neighbours[index]:
+                    if numbers[n] is not None and n not in queued_numbers:
+                        queued_numbers.add(n)
+                        dirty_numbers.append(n)
+
+    if changed is not None:
+        touched(changed)
+
+    while rows or columns or dirty_numbers:
+        while rows:
+            y = rows.popleft()
+            queued_rows.discard(y)
+            changed = bitboard.check_and_fill_row(y)
+            if changed is None:
+                return False
+            touched(changed)
+
+        while columns:
+            x = columns.popleft()
+            queued_columns.discard(x)
+            changed = bitboard.check_and_fill_column(x)
+            if changed is None:
+                return False
+            touched(changed)
+
+        while dirty_numbers and not rows and not columns:
+            index = dirty_numbers.popleft()
+            queued_numbers.discard(index)
+            counts = bitboard.neighbour_counts(index)
+            if not bitboard.number_check(index, counts):
+                return False
+            touched(bitboard.try_to_fill(index, counts))
+
+    return True
+
+
+class Grade(NamedTuple):
+    """What grade_url found out about a puzzle"""
+    solved: bool            # the deductions coloured every cell
+    depth: int | None       # deepest contradiction_count a deduction needed, None if it wasnt solved
+    unique: bool | None     # exactly one solution, None if the count gave up
+    steps: int              # can_be_color searches made while deducing, nested ones included
+    deductions: Tuple[int, ...]  # cells first found at each depth, propagation counts as depth 0
+    solution: str | None    # the solved grid in url format, when there is exactly one
+
+
+def is_solution(bitboard: BitBoard) -> bool:
+    """Whether every cell is known and every line and number rule holds"""
+    full_row = (1 << bitboard.width) - 1
+    if any(known != full_row for known in bitboard.known):
+        return False
+    for y in range(bitboard.height):
+        red, blue = bitboard.row_counts(y)
+        if red > bitboard.row_max or blue > bitboard.row_max:
+            return False
+    for x in range(bitboard.width):
+        red, blue = bitboard.column_counts(x)
+        if red > bitboard.column_max or blue > bitboard.column_max:
+            return False
+    return all(bitboard.number_check(i) for i, n in enumerate(bitboard.numbers) if n is not None)
+
+
+def known_count(bitboard: BitBoard) -> int:
+    return sum(known.bit_count() for known in bitboard.known)
+
+
+def unknown_cells(bitboard: BitBoard) -> List[int]:
+    width = bitboard.width
+    full_row = (1 << width) - 1
+    cells = []
+    for y, known in enumerate(bitboard.known):
+        unknown = ~known & full_row
+        while unknown:
+            low = unknown & -unknown
+            cells.append(y * width + low.bit_length() - 1)
+            unknown ^= low
+    return cells
+
+
+def find_solutions(bitboard: BitBoard, limit: int = 2) -> List[Tuple[int, ...]]:
+    """
+    Up to limit solutions of the position, as their red row masks. Branches on the first unknown cell,
+    propagating lines and numbers after every guess, and stops as soon as limit are found.
+    Iterative so big empty boards cant run out of stack. The bitboard is left as it was
+    """
+    root = len(bitboard.trail)
+    solutions: List[Tuple[int, ...]] = []
+    # [cell, next color to try (0 blue, 1 red, 2 both done), trail mark before it]
+    stack: List[List[int]] = []
+    ok = propagate(bitboard)
+    while True:
+        if ok:
+            unknown = unknown_cells(bitboard)
+            if unknown:
+                # propagation does the real work, picking a smarter cell to guess cost more than it saved
+                stack.append([unknown[0], 0, len(bitboard.trail)])
+            elif is_solution(bitboard):
+                solutions.append(tuple(bitboard.red))
+                if len(solutions) >= limit:
+                    break
+
+        while stack and stack[-1][1] == 2:
+            stack.pop()
+        if not stack:
+            break
+        frame = stack[-1]
+        bitboard.undo_to(frame[2])
+        bitboard.set_color(frame[0], frame[1] == 1)
+        frame[1] += 1
+        ok = propagate(bitboard, changed=(frame[0],))
+
+    bitboard.undo_to(root)
+    return solutions
+
+
+def count_solutions(bitboard: BitBoard, limit: int = 2) -> int:
+    """How many solutions the position has, counting stops at limit. The bitboard is left as it was"""
+    return len(find_solutions(bitboard, limit))
+
+
+def solution_url(bitboard: BitBoard, red: Tuple[int, ...]) -> str:
+    """url of a solution from find_solutions, every cell shown"""
+    solved = BitBoard(bitboard.width, bitboard.height)
+    solved.numbers = list(bitboard.numbers)
+    solved.load_state(((1 << bitboard.width) - 1,) * bitboard.height, red)
+    return solved.to_url_format()
+
+
+class Uniqueness(NamedTuple):
+    """What check_unique found"""
+    solutions: int                  # how many there are, counting stopped at 2
+    unique: bool
+    counterexample: str | None      # url of a solution other than the board's own colors, if there is one
+
+
+def check_unique(board: Board) -> Uniqueness:
+    """
+    Proves the puzzle on a Board has exactly one solution, or shows it doesnt. Only the visible colors and
+    numbers are used, the hidden colors are just what a second solution gets compared against
+    """
+    bitboard = BitBoard.from_board(board)
+    intended = tuple(bitboard.red)
+    solutions = find_solutions(bitboard, 2)
+    counterexample = next((red for red in solutions if red != intended), None)
+    return Uniqueness(len(solutions), len(solutions) == 1,
+                      solution_url(bitboard, counterexample) if counterexample is not None else None)
+
+
+def solve(bitboard: BitBoard, max_depth: int = 3, count_limit: int | None = 2, line_checks=False,
+          global_propagation=True, max_steps: int | None = 50_000) -> Grade:
+    """
+    Solves the puzzle on bitboard with the generator's own deductions, cheapest first. Every unknown cell is
+    probed with can_be_color at depth 0, and only when a whole sweep finds nothing does it go one contradiction
+    deeper (back to 0 as soon as something turns up), up to max_depth or until max_steps searches are used.
+    global_propagation also runs propagate over the whole board after every placed cell, which is much faster
+    than only having can_be_color's propagation around each guess and counts as depth 0.
+    Deductions hold in every solution, so when they colour the whole board the solution is unique.
+    When they get stuck count_solutions decides, up to count_limit (None skips that and leaves unique as None).
+    The bitboard ends up holding whatever got deduced
+    """
+    deductions = [0] * (max_depth + 1)
+    budget = Budget(max_steps=max_steps)
+    bitboard.budget = budget
+
+    def place(index: int, red) -> bool:
+        """colours a deduced cell visibly and propagates it, False if that breaks something"""
+        bitboard.set_color(index, red)
+        if not global_propagation:
+            return True
+        before = known_count(bitboard)
+        ok = propagate(bitboard, changed=(index,))
+        deductions[0] += known_count(bitboard) - before
+        return ok
+
+    def invalid() -> Grade:
+        return Grade(False, None, False, budget.steps, tuple(deductions), None)
+
+    if global_propagation:
+        before = known_count(bitboard)
+        if not propagate(bitboard):
+            return invalid()
+        deductions[0] += known_count(bitboard) - before
+
+    deepest = 0
+    depth = 0
+    mark = len(bitboard.trail)
+    try:
+        while depth <= max_depth:
+            unknown = sorted(unknown_cells(bitboard), key=bitboard.candidate_slack)
+            if not unknown:
+                break
+            progress = False
+            for index in unknown:
+                if bitboard.is_known(index):
+                    continue
+                # a search that runs out of steps leaves its trial writes behind, this is where they get undone
+                mark = len(bitboard.trail)
+                if bitboard.can_be_color(index, False, contradiction_count=depth, original_contradiction=depth,
+                                         line_checks=line_checks):
+                    if bitboard.can_be_color(index, True, contradiction_count=depth, original_contradiction=depth,
+                                             line_checks=line_checks):
+                        continue
+                    can_red = False
+                else:
+                    # if red is impossible as well the checks at the end catch it
+                    can_red = True
+                deductions[depth] += 1
+                deepest = max(deepest, depth)
+                progress = True
+                if not place(index, can_red):
+                    return invalid()
+                if depth > 0:
+                    # the cheaper deductions might work again now
+                    break
+            depth = 0 if progress else depth + 1
+    except PuzzleRejected:
+        # out of steps, back to before the probe that ran out so only what was deduced stays
+        bitboard.undo_to(mark)
+    finally:
+        bitboard.budget = None
+
+    if not unknown_cells(bitboard):
+        if not is_solution(bitboard):
+            return invalid()
+        return Grade(True, deepest, True, budget.steps, tuple(deductions), bitboard.to_url_format())
+
+    if count_limit is None:
+        return Grade(False, None, None, budget.steps, tuple(deductions), None)
+    found = count_solutions(bitboard, count_limit)
+    return Grade(False, None, found == 1, budget.steps, tuple(deductions), None)
+
+
+def grade_url(url: str, width: int, height: int, max_depth: int = 3, count_limit: int | None = 2,
+              line_checks=False, global_propagation=True, max_steps: int | None = 50_000) -> Grade:
+    """Decodes a to_url_format puzzle and solves it, see solve"""
+    return solve(BitBoard.from_url(url, width, height), max_depth, count_limit, line_checks, global_propagation,
+                 max_steps)
+
+
+def parse_puzzle(line: str) -> Tuple[str, int, int]:
+    """One input line, either a json record with url, width and height (like stream.py writes) or url width height"""
+    line = line.strip()
+    if line.startswith("{"):
+        record = json.loads(line)
+        return record["url"], record["width"], record["height"]
+    url, width, height = line.split()
+    return url, int(width), int(height)
+
+
+def _grade_line(line: str, max_depth: int, count_limit: int | None, line_checks: bool,
+                global_propagation: bool, max_steps: int | None, solution: bool) -> Dict[str, Any]:
+    url, width, height = parse_puzzle(line)
+    try:
+        grade = grade_url(url, width, height, max_depth, count_limit, line_checks, global_propagation, max_steps)
+    except ValueError as error:
+        return {"url": url, "width": width, "height": height, "error": str(error)}
+    record = {"url": url, "width": width, "height": height, "solved": grade.solved, "depth": grade.depth,
+              "unique": grade.unique, "steps": grade.steps, "deductions": list(grade.deductions)}
+    if solution:
+        record["solution"] = grade.solution
+    return record
+
+
+def grade_stream(lines: Iterable[str], workers: int = 1, max_depth: int = 3, count_limit: int | None = 2,
+                 line_checks=False, global_propagation=True, max_steps: int | None = 50_000,
+                 solution=False) -> Iterator[Dict[str, Any]]:
+    """
+    Grades puzzles one input line at a time (see parse_puzzle) and yields a record per puzzle in input order,
+    lazily so a corpus never has to fit in memory. workers above 1 spreads the lines over that many processes
+    """
+    lines = (line for line in lines if line.strip())
+    grade = partial(_grade_line, max_depth=max_depth, count_limit=count_limit, line_checks=line_checks,
+                    global_propagation=global_propagation, max_steps=max_steps, solution=solution)
+    if workers <= 1:
+        yield from map(grade, lines)
+        return
+    with mp.get_context().Pool(workers) as pool:
+        yield from pool.imap(grade, lines, chunksize=64)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solves and grades url format puzzles, one json line out per puzzle in")
+    parser.add_argument("inputs", nargs="*", default=["-"],
+                        help="files of json records or \"url width height\" lines, - (the default) reads stdin")
+    parser.add_argument("--max-depth", type=int, default=3, help="deepest contradiction_count to try")
+    parser.add_argument("--count-limit", type=int, default=2,
+                        help="how many solutions to count up to when the deductions get stuck, 0 skips counting")
+    parser.add_argument("--line-checks", action="store_true", help="have can_be_color check every line it touches, not just the guessed cell's")
+    parser.add_argument("--local", action="store_true",
+                        help="only the propagation can_be_color does around a guess, not the whole board after each cell")
+    parser.add_argument("--max-steps", type=int, default=50_000,
+                        help="can_be_color searches per puzzle before the deductions give up, 0 for no limit")
+    parser.add_argument("--solution", action="store_true", help="include the solved grid")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    def read_lines():
+        for name in args.inputs:
+            if name == "-":
+                yield from sys.stdin
+            else:
+                with open(name, encoding="utf-8") as file:
+                    yield from file
+
+    for record in grade_stream(read_lines(), args.workers, args.max_depth, args.count_limit or None,
+                               args.line_checks, not args.local, args.max_steps or None, args.solution):
+        sys.stdout.write(json.dumps(record, separators=(",", ":")) + "\n")
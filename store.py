@@ -0,0 +1,337 @@
+import argparse
+import glob
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Any, Dict, Iterator, List, NamedTuple, Tuple
+
+from board import url_values, values_url
+
+# data file header: magic, version, width, height, record size, header size
+DATA_HEADER = struct.Struct("<4sHBBHH")
+DATA_MAGIC = b"URJD"
+# index file header: magic, version, entries, records covered
+INDEX_HEADER = struct.Struct("<4sHxxIQ")
+INDEX_MAGIC = b"URJI"
+# one index entry: width, height, contradiction_count, numbers, first position in the id list, how many ids
+INDEX_ENTRY = struct.Struct("<HHHHQQ")
+VERSION = 1
+# every record starts with the contradiction_count
+RECORD_PREFIX = struct.Struct("<H")
+
+# (width, height, contradiction_count, numbers), what the side index is keyed on
+type IndexKey = Tuple[int, int, int, int]
+
+
+class StoredPuzzle(NamedTuple):
+    """One puzzle read back out of a store, url is the same string to_url_format gave"""
+    url: str
+    width: int
+    height: int
+    contradiction_count: int
+
+
+def packed_size(cells: int) -> int:
+    """bytes the cells of one board take, 6 bits each"""
+    return (cells * 6 + 7) // 8
+
+
+def pack_url(url: str) -> bytes:
+    """
+    Packs a to_url_format string into 6 bits a cell, the same bits the url character stands for:
+    bit 0 visible, bit 1 color (1 red) and bits 2-5 the shown number plus one (0 when there is none)
+    """
+    value = 0
+    for i, cell in enumerate(url_values(url)):
+        value |= cell << (6 * i)
+    return value.to_bytes(packed_size(len(url)), "little")
+
+
+def unpack_url(data: bytes, cells: int) -> str:
+    """the url of cells packed cells, pack_url backwards"""
+    value = int.from_bytes(data, "little")
+    return values_url(bytes(value >> (6 * i) & 63 for i in range(cells)))
+
+
+def count_numbers(url: str) -> int:
+    """how many numbers the puzzle shows"""
+    return sum(1 for cell in url_values(url) if cell >= 4)
+
+
+def data_path(base: str, width: int, height: int) -> str:
+    return f"{base}.{width}x{height}.urjo"
+
+
+def index_path(base: str) -> str:
+    return f"{base}.index"
+
+
+def matches(value: int, wanted) -> bool:
+    """None matches anything, an int only itself and anything else (a range, a set) by membership"""
+    if wanted is None:
+        return True
+    if isinstance(wanted, int):
+        return value == wanted
+    return value in wanted
+
+
+class PuzzleStoreWriter():
+    """
+    Writes puzzles into base.WxH.urjo, one file of fixed size records per board shape, and the side index
+    base.index when closed. Like PuzzleStreamWriter it never overwrites, a store is written once.
+    A record is the contradiction_count as two bytes and then the packed cells (see pack_url), so an 8x8 puzzle
+    takes 50 bytes instead of the 64 character url plus its json
+    """
+
+    def __init__(self, base: str):
+        # checked up front, the data files only clash once a puzzle of their shape comes along and by then
+        # closing would already have replaced the old index
+        if os.path.exists(index_path(base)):
+            raise FileExistsError(f"{index_path(base)} already exists, a store is only written once")
+        self.base = base
+        self.files: Dict[Tuple[int, int], Any] = {}
+        self.counts: Dict[Tuple[int, int], int] = {}
+        self.index: Dict[IndexKey, List[int]] = {}
+        self.written = 0
+
+    def _open(self, width: int, height: int):
+        file = open(data_path(self.base, width, height), "xb")
+        record_size = RECORD_PREFIX.size + packed_size(width * height)
+        file.write(DATA_HEADER.pack(DATA_MAGIC, VERSION, width, height, record_size, DATA_HEADER.size))
+        self.files[(width, height)] = file
+        self.counts[(width, height)] = 0
+        return file
+
+    def write(self, url: str, width: int, height: int, contradiction_count: int):
+        """appends one puzzle, url as to_url_format gives it"""
+        if len(url) != width * height:
+            raise ValueError("URL length does not match provided dimensions")
+        file = self.files.get((width, height)) or self._open(width, height)
+        file.write(RECORD_PREFIX.pack(contradiction_count) + pack_url(url))
+        key = (width, height, contradiction_count, count_numbers(url))
+        self.index.setdefault(key, []).append(self.counts[(width, height)])
+        self.counts[(width, height)] += 1
+        self.written += 1
+
+    def close(self):
+        for file in self.files.values():
+            if not file.closed:
+                file.flush()
+                os.fsync(file.fileno())
+                file.close()
+        write_index(self.base, self.index, self.written)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_index(base: str, index: Dict[IndexKey, List[int]], records: int):
+    """writes the side index sorted by key, through a temporary file so a reader never sees half of one"""
+    entries = []
+    ids = array("I")
+    for key in sorted(index):
+        entries.append(INDEX_ENTRY.pack(*key, len(ids), len(index[key])))
+        ids.extend(index[key])
+    if sys.byteorder != "little":
+        ids.byteswap()
+    temporary = index_path(base) + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(INDEX_HEADER.pack(INDEX_MAGIC, VERSION, len(entries), records))
+        file.write(b"".join(entries))
+        ids.tofile(file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, index_path(base))
+
+
+class _ShapeFile():
+    """one mmapped data file"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.width, self.height, self.record_size, self.header_size = DATA_HEADER.unpack_from(self.map)
+        if magic != DATA_MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} puzzle store file")
+        self.cells = self.width * self.height
+        # a torn last record from a crash is left out
+        self.count = (len(self.map) - self.header_size) // self.record_size
+
+    def read(self, position: int) -> StoredPuzzle:
+        if not 0 <= position < self.count:
+            raise IndexError(f"record {position} out of range for {self.width}x{self.height}")
+        start = self.header_size + position * self.record_size
+        contradiction_count, = RECORD_PREFIX.unpack_from(self.map, start)
+        url = unpack_url(self.map[start + RECORD_PREFIX.size:start + self.record_size], self.cells)
+        return StoredPuzzle(url, self.width, self.height, contradiction_count)
+
+
+class PuzzleStore():
+    """
+    Reads a store written by PuzzleStoreWriter through mmap, so looking a puzzle up, sampling and filtered
+    iteration only touch the records they return. The filters of select and sample take None (anything),
+    an int or a range/set of values for each of width, height, contradiction_count and numbers.
+    Without an up to date index (say the writer died) the index is rebuilt in memory by one pass over the records
+    """
+
+    def __init__(self, base: str):
+        self.base = base
+        self.shapes: Dict[Tuple[int, int], _ShapeFile] = {}
+        for path in sorted(glob.glob(glob.escape(base) + ".*.urjo")):
+            shape_file = _ShapeFile(path)
+            self.shapes[(shape_file.width, shape_file.height)] = shape_file
+        self.records = sum(shape_file.count for shape_file in self.shapes.values())
+
+        self.index_map = None
+        self.entries: List[Tuple[IndexKey, int, int]] = []
+        self.ids = None
+        if not self._load_index():
+            self._rebuild_index()
+
+    def _load_index(self) -> bool:
+        """maps base.index, False if there isnt one or it doesnt cover every record"""
+        path = index_path(self.base)
+        if not os.path.exists(path) or os.path.getsize(path) < INDEX_HEADER.size:
+            return False
+        with open(path, "rb") as file:
+            index_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, entry_count, records = INDEX_HEADER.unpack_from(index_map)
+        if magic != INDEX_MAGIC or version != VERSION or records != self.records:
+            index_map.close()
+            return False
+        table_end = INDEX_HEADER.size + entry_count * INDEX_ENTRY.size
+        for values in INDEX_ENTRY.iter_unpack(index_map[INDEX_HEADER.size:table_end]):
+            self.entries.append((values[:4], values[4], values[5]))
+        if sys.byteorder == "little":
+            self.ids = memoryview(index_map)[table_end:].cast("I")
+        else:
+            self.ids = array("I", index_map[table_end:])
+            self.ids.byteswap()
+        self.index_map = index_map
+        return True
+
+    def _rebuild_index(self):
+        index: Dict[IndexKey, List[int]] = {}
+        for (width, height), shape_file in self.shapes.items():
+            for position in range(shape_file.count):
+                puzzle = shape_file.read(position)
+                key = (width, height, puzzle.contradiction_count, count_numbers(puzzle.url))
+                index.setdefault(key, []).append(position)
+        self.ids = array("I")
+        for key in sorted(index):
+            self.entries.append((key, len(self.ids), len(index[key])))
+            self.ids.extend(index[key])
+
+    def __len__(self) -> int:
+        return self.records
+
+    def __iter__(self) -> Iterator[StoredPuzzle]:
+        """every puzzle, shape by shape in the order they were written"""
+        for shape_file in self.shapes.values():
+            for position in range(shape_file.count):
+                yield shape_file.read(position)
+
+    def keys(self) -> Dict[IndexKey, int]:
+        """how many puzzles there are for every (width, height, contradiction_count, numbers)"""
+        return {key: count for key, _, count in self.entries}
+
+    def read(self, width: int, height: int, position: int) -> StoredPuzzle:
+        """the position-th puzzle written for that shape"""
+        return self.shapes[(width, height)].read(position)
+
+    def _matching(self, width=None, height=None, contradiction_count=None, numbers=None):
+        return [(key, start, count) for key, start, count in self.entries
+                if matches(key[0], width) and matches(key[1], height)
+                and matches(key[2], contradiction_count) and matches(key[3], numbers)]
+
+    def select(self, width=None, height=None, contradiction_count=None, numbers=None) -> Iterator[StoredPuzzle]:
+        """Lazily yields every matching puzzle, grouped by index key"""
+        for key, start, count in self._matching(width, height, contradiction_count, numbers):
+            shape_file = self.shapes[key[:2]]
+            for position in self.ids[start:start + count]:
+                yield shape_file.read(position)
+
+    def count(self, width=None, height=None, contradiction_count=None, numbers=None) -> int:
+        return sum(count for _, _, count in self._matching(width, height, contradiction_count, numbers))
+
+    def sample(self, k: int, rng=random, width=None, height=None, contradiction_count=None,
+               numbers=None) -> List[StoredPuzzle]:
+        """k different matching puzzles picked uniformly at random, fewer if there arent k"""
+        matching = self._matching(width, height, contradiction_count, numbers)
+        ends = list(accumulate(count for _, _, count in matching))
+        if not ends:
+            return []
+        puzzles = []
+        for pick in rng.sample(range(ends[-1]), min(k, ends[-1])):
+            entry = bisect_right(ends, pick)
+            key, start, count = matching[entry]
+            offset = pick - (ends[entry] - count)
+            puzzles.append(self.shapes[key[:2]].read(self.ids[start + offset]))
+        return puzzles
+
+    def close(self):
+        # the index view has to go before its map can be closed
+        if isinstance(self.ids, memoryview):
+            self.ids.release()
+        if self.index_map is not None:
+            self.index_map.close()
+        for shape_file in self.shapes.values():
+            shape_file.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    from stream import read_records
+
+    parser = argparse.ArgumentParser(description="Converts between json puzzle streams and the packed puzzle store")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack = commands.add_parser("pack", help="packs the records of a json stream (see main.py) into a new store")
+    pack.add_argument("stream", help="base of the json stream, like output/1700000000")
+    pack.add_argument("store", help="base of the store to write")
+    unpack = commands.add_parser("unpack", help="prints a store back out as json lines, in the order it was written")
+    unpack.add_argument("store")
+    info = commands.add_parser("info", help="counts per index key")
+    info.add_argument("store")
+    sample = commands.add_parser("sample", help="prints random puzzles as json lines")
+    sample.add_argument("store")
+    sample.add_argument("-k", type=int, default=10)
+    sample.add_argument("--width", type=int, default=None)
+    sample.add_argument("--height", type=int, default=None)
+    sample.add_argument("--contradictions", type=int, default=None)
+    sample.add_argument("--numbers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        with PuzzleStoreWriter(args.store) as writer:
+            for record in read_records(args.stream):
+                writer.write(record["url"], record["width"], record["height"], record["contradiction_count"])
+        print(f"packed {writer.written} puzzles")
+    elif args.command == "info":
+        with PuzzleStore(args.store) as store:
+            print(f"{len(store)} puzzles")
+            for (width, height, contradictions, numbers), count in store.keys().items():
+                print(f"{width}x{height} contradictions {contradictions} numbers {numbers}: {count}")
+    else:
+        with PuzzleStore(args.store) as store:
+            if args.command == "unpack":
+                puzzles = iter(store)
+            else:
+                puzzles = store.sample(args.k, width=args.width, height=args.height,
+                                       contradiction_count=args.contradictions, numbers=args.numbers)
+            for puzzle in puzzles:
+                sys.stdout.write(json.dumps(puzzle._asdict(), separators=(",", ":")) + "\n")
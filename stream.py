@@ -0,0 +1,105 @@
+import glob
+import json
+import os
+import time
+
+from typing import Any, Iterator, List
+
+
+class PuzzleStreamWriter():
+    """
+    Appends one JSON record per line to base.0000.jsonl, base.0001.jsonl, ... instead of rewriting one big file.
+    Records are fsynced every sync_every records or sync_interval seconds, whichever comes first,
+    and a new part is started once the current one reaches max_bytes or max_records (None turns that limit off)
+    """
+
+    def __init__(self, base: str, sync_every: int = 100, sync_interval: float = 5.0,
+                 max_bytes: int | None = 64 * 1024 * 1024, max_records: int | None = None):
+        self.base = base
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.max_bytes = max_bytes
+        self.max_records = max_records
+
+        self.part = -1
+        self.file = None
+        self.part_bytes = 0
+        self.part_records = 0
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.written = 0
+        self._open_next_part()
+
+    def _open_next_part(self):
+        """closes the current part (if any) and starts the next one"""
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+        self.part += 1
+        self.file = open(part_path(self.base, self.part), "x", encoding="utf-8")
+        self.part_bytes = 0
+        self.part_records = 0
+
+    def write(self, record: Any):
+        """appends one record, anything json can serialise"""
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        if self.part_records and (
+                (self.max_bytes is not None and self.part_bytes + len(line) > self.max_bytes) or
+                (self.max_records is not None and self.part_records >= self.max_records)):
+            self._open_next_part()
+
+        self.file.write(line)
+        self.part_bytes += len(line)
+        self.part_records += 1
+        self.unsynced += 1
+        self.written += 1
+
+        if self.unsynced >= self.sync_every or time.monotonic() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """pushes everything written so far to disk"""
+        if self.file is None or self.file.closed:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if self.file is not None and not self.file.closed:
+            self.sync()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def part_path(base: str, part: int) -> str:
+    """file name of one part of a rotated set"""
+    return f"{base}.{part:04d}.jsonl"
+
+
+def part_paths(base: str) -> List[str]:
+    """every part of a rotated set in the order it was written"""
+    paths = glob.glob(glob.escape(base) + ".*.jsonl")
+    parts = []
+    for path in paths:
+        number = path[len(base) + 1:-len(".jsonl")]
+        if number.isdigit():
+            parts.append((int(number), path))
+    return [path for _, path in sorted(parts)]
+
+
+def read_records(base: str) -> Iterator[Any]:
+    """Lazily yields every record of a rotated set, one file open at a time, skipping a torn last line from a crash"""
+    for path in part_paths(base):
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if not line.endswith("\n"):
+                    # the writer died mid line, everything before it is still good
+                    break
+                yield json.loads(line)
@@ -0,0 +1,35 @@
+import random
+
+from board import BoardPool
+from generator import UrjoGenerator
+
+SHAPES = [(6, 6), (7, 5), (6, 6), (7, 5), (5, 5)]
+
+
+def test_pool_acquire_resets_released_boards():
+    pool = BoardPool()
+    board = pool.acquire(4, 3)
+    board.all_squares[0].write(1, False)
+    pool.release(board)
+    again = pool.acquire(4, 3)
+    assert again is board
+    assert again.shape() == (4, 3)
+    assert all(sq.color is None for sq in again.all_squares)
+    assert pool.acquire(4, 3) is not board
+
+
+def test_generator_keeps_a_board_per_shape():
+    random.seed(1)
+    plain = [UrjoGenerator().create_puzzle(w, h, contradiction_count=1, bitboard=True).to_url_format()
+             for w, h in SHAPES]
+
+    random.seed(1)
+    generator = UrjoGenerator(board_pool=BoardPool())
+    boards = {}
+    pooled = []
+    for w, h in SHAPES:
+        board = generator.create_puzzle(w, h, contradiction_count=1, bitboard=True)
+        # the same cells come back every time a shape comes around again
+        assert boards.setdefault((w, h), board) is board
+        pooled.append(board.to_url_format())
+    assert pooled == plain
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from board import Board, BoardPool
+from codec import decode_urls, encode_values, encode_boards, decode_boards, iter_boards
+from generator import UrjoGenerator
+
+
+def puzzle_urls(count=40, width=6, height=5):
+    random.seed(7)
+    generator = UrjoGenerator()
+    return [generator.create_puzzle(width, height, contradiction_count=1, bitboard=True).to_url_format()
+            for _ in range(count)]
+
+
+def test_codec_round_trips_match_the_board_methods():
+    urls = puzzle_urls()
+    boards = [Board.from_url(url, 6, 5) for url in urls]
+    assert encode_boards(boards) == [board.to_url_format() for board in boards] == urls
+    assert encode_values(decode_urls(urls, 6, 5)) == urls
+    assert [board.to_url_format() for board in decode_boards(urls, 6, 5)] == urls
+    assert [board.to_url_format() for board in iter_boards(urls, 6, 5, batch=7)] == urls
+    assert [bytes(board.cell_values()) for board in boards] == decode_urls(urls, 6, 5)
+
+
+def test_codec_rejects_what_from_url_rejects():
+    url = puzzle_urls(1)[0]
+    for bad in (url[:-1] + "!", url[:-1]):
+        with pytest.raises(ValueError):
+            Board.from_url(bad, 6, 5)
+        with pytest.raises(ValueError):
+            decode_urls([url, bad], 6, 5)
+
+
+def test_array_codec_round_trips():
+    pytest.importorskip("numpy")
+    from codec import decode_array, encode_array, cell_fields, from_fields
+
+    urls = puzzle_urls()
+    values = decode_array(urls, 6, 5)
+    assert values.shape == (len(urls), 5, 6)
+    assert encode_array(values) == urls
+    assert (from_fields(*cell_fields(values)) == values).all()
+
+
+def test_mixed_shapes_and_pooled_boards():
+    urls = puzzle_urls(6)
+    small = puzzle_urls(3, 4, 4)
+    mixed = [urls[0], small[0], urls[1], small[1]]
+    assert encode_values([decode_urls([url], *((6, 5) if len(url) == 30 else (4, 4)))[0] for url in mixed]) == mixed
+
+    pool = BoardPool()
+    boards = decode_boards(urls[:2], 6, 5, pool)
+    for board in boards:
+        pool.release(board)
+    again = decode_boards(urls[2:4], 6, 5, pool)
+    assert {id(board) for board in again} == {id(board) for board in boards}
+    assert [board.to_url_format() for board in again] == urls[2:4]
@@ -0,0 +1,105 @@
+import random
+
+import pytest
+
+from batch import generate_batch
+from board import Board, url_values, values_url
+from dedup import BloomFilter, ExactFilter, PuzzleDeduper, canonical_board, canonical_key, canonical_url, symmetries
+from generator import UrjoGenerator
+
+
+def make_urls(count, width, height, seed=6):
+    random.seed(seed)
+    generator = UrjoGenerator()
+    return [generator.create_puzzle(width, height, number_of_numbers=3, contradiction_count=1, bitboard=True)
+            .to_url_format() for _ in range(count)]
+
+
+def grid(url, width):
+    return [url[i:i + width] for i in range(0, len(url), width)]
+
+
+def moved_copies(url, width, height):
+    """every rotation and reflection that keeps the shape, worked out on the rows of characters"""
+    rows = grid(url, width)
+    flips = [rows, [row[::-1] for row in rows], rows[::-1], [row[::-1] for row in rows[::-1]]]
+    if width == height:
+        turned = ["".join(column) for column in zip(*rows)]
+        flips += [turned, [row[::-1] for row in turned], turned[::-1], [row[::-1] for row in turned[::-1]]]
+    return ["".join(rows) for rows in flips]
+
+
+def swapped(url):
+    return values_url(bytes(value ^ 2 for value in url_values(url)))
+
+
+@pytest.mark.parametrize("width, height", [(5, 5), (6, 4)])
+def test_symmetric_copies_share_a_canonical_url(width, height):
+    urls = make_urls(6, width, height)
+    assert len(symmetries(width, height)) == (8 if width == height else 4)
+    for url in urls:
+        copies = moved_copies(url, width, height)
+        copies += [swapped(copy) for copy in copies]
+        canonical = canonical_url(url, width, height)
+        assert {canonical_url(copy, width, height) for copy in copies} == {canonical}
+        assert canonical in copies
+        assert canonical_board(Board.from_url(url, width, height)) == canonical
+    assert len({canonical_url(url, width, height) for url in urls}) == len(set(urls))
+
+
+def test_canonical_key_tells_shapes_apart():
+    url = make_urls(1, 6, 4)[0]
+    assert canonical_key(url, 6, 4) != canonical_key(url, 4, 6)
+    with pytest.raises(ValueError):
+        canonical_url(url, 5, 5)
+
+
+@pytest.mark.parametrize("make_filter", [ExactFilter, lambda: BloomFilter(1000, 1e-3)])
+def test_filters_never_let_a_duplicate_through(make_filter):
+    filter = make_filter()
+    keys = [canonical_key(url, 5, 5) for url in make_urls(20, 5, 5)]
+    assert not any(key in filter for key in keys)
+    first = [filter.add(key) for key in keys]
+    assert sum(first) == len(filter) == len(set(keys))
+    assert all(key in filter for key in keys)
+    assert not any(filter.add(key) for key in keys)
+
+
+def test_bloom_false_positives_stay_near_the_error_rate():
+    bloom = BloomFilter(20_000, 0.01)
+    rng = random.Random(1)
+    for _ in range(20_000):
+        bloom.add(rng.randbytes(16))
+    # measured on keys never added, with the filter at capacity
+    false_positives = sum(rng.randbytes(16) in bloom for _ in range(20_000)) / 20_000
+    assert 0.005 < false_positives < 0.015
+
+
+def test_deduper_counts_and_reads_earlier_runs():
+    with pytest.raises(ValueError):
+        PuzzleDeduper("sorted")
+    urls = make_urls(8, 5, 5)
+    deduper = PuzzleDeduper("exact")
+    records = [{"url": url, "width": 5, "height": 5} for url in urls]
+    assert deduper.add_records(records) == len(set(urls))
+    rotated = moved_copies(urls[0], 5, 5)[5]
+    assert not deduper.add(swapped(rotated), 5, 5)
+    assert deduper.seen == len(urls) + 1
+    assert deduper.duplicates == deduper.seen - len(set(urls))
+
+
+def test_dropped_results_are_made_again():
+    kept = []
+
+    def on_result(result):
+        # every other result counts as a duplicate
+        if len(kept) % 2 == 0 and result.url not in kept:
+            kept.append(result.url)
+            return True
+        kept.append(None)
+        return False
+
+    params = {"dim1": 5, "dim2": 5, "contradiction_count": 1, "bitboard": True}
+    delivered = generate_batch(params, on_result, workers=2, target=6, seed=3)
+    assert delivered == 6
+    assert sum(url is not None for url in kept) == 6
@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from board import Board
+from codec import cell_fields, decode_array
+from generator import UrjoGenerator
+from lines import lines_different
+
+np = pytest.importorskip("numpy")
+
+from grids import grids_from_boards, grid_numbers, identical_lines, line_balance, numbers_match, valid_grids
+
+
+def solved_boards(count=30, width=7, height=5):
+    random.seed(11)
+    generator = UrjoGenerator()
+    boards = []
+    for i in range(count):
+        generator.create_solved_board(width, height, uniform_grid=i % 2 == 0)
+        boards.append(Board.from_url(generator.board.to_url_format(), width, height))
+    return boards
+
+
+def test_grid_numbers_match_fill_numbers():
+    boards = solved_boards()
+    grids = grids_from_boards(boards)
+    numbers = grid_numbers(grids)
+    rows, columns = line_balance(grids)
+    for k, board in enumerate(boards):
+        board.fill_numbers()
+        assert numbers[k].tolist() == [[sq.number for sq in row.cells] for row in board.rows]
+        assert rows[k].tolist() == [row.check_color_count() for row in board.rows]
+        assert columns[k].tolist() == [column.check_color_count() for column in board.columns]
+
+
+def test_identical_lines_match_lines_different():
+    # 3x4 grids repeat lines often enough to see both answers
+    boards = solved_boards(40, 3, 4)
+    rows, columns = identical_lines(grids_from_boards(boards))
+    assert rows.any() and not rows.all() and columns.any() and not columns.all()
+    for k, board in enumerate(boards):
+        assert rows[k].tolist() == [not lines_different(a, b) for a, b in zip(board.rows, board.rows[1:])]
+        assert columns[k].tolist() == [not lines_different(a, b) for a, b in zip(board.columns, board.columns[1:])]
+
+
+def test_valid_grids():
+    grids = grids_from_boards(solved_boards(20, 3, 4))
+    assert valid_grids(grids).all()
+    same_rows, same_columns = identical_lines(grids)
+    assert (valid_grids(grids, identical_checks=True) == ~(same_rows.any(axis=1) | same_columns.any(axis=1))).all()
+    broken = grids.copy()
+    broken[3, 0, :] = 1
+    assert valid_grids(broken).tolist() == [k != 3 for k in range(len(grids))]
+
+
+def test_numbers_match_shown_numbers():
+    random.seed(12)
+    generator = UrjoGenerator()
+    urls = [generator.create_puzzle(6, 5, number_of_numbers=8, contradiction_count=1, bitboard=True).to_url_format()
+            for _ in range(10)]
+    colors, _, numbers = cell_fields(decode_array(urls, 6, 5))
+    assert (numbers >= 0).any()
+    assert numbers_match(colors, numbers).all()
+    shown = np.argwhere(numbers[4] >= 0)[0]
+    numbers[4][tuple(shown)] = (numbers[4][tuple(shown)] + 1) % 9
+    assert numbers_match(colors, numbers).tolist() == [k != 4 for k in range(len(urls))]
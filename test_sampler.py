@@ -0,0 +1,65 @@
+import inspect
+import math
+import random
+import sys
+
+from collections import Counter
+from itertools import product
+
+import pytest
+
+from generator import UrjoGenerator
+from sampler import GridSampler, sampler_fits
+
+
+def balanced(line) -> bool:
+    most = math.ceil(len(line) / 2)
+    return sum(line) <= most and len(line) - sum(line) <= most
+
+
+def every_grid(width, height):
+    """brute force, every coloring whose rows and columns are all balanced"""
+    for cells in product((False, True), repeat=width * height):
+        rows = [cells[y * width:(y + 1) * width] for y in range(height)]
+        if all(balanced(row) for row in rows) and all(balanced(column) for column in zip(*rows)):
+            yield tuple(map(tuple, rows))
+
+
+@pytest.mark.parametrize("width, height", [(1, 1), (3, 3), (4, 4), (5, 3), (2, 6)])
+def test_total_counts_every_grid(width, height):
+    assert GridSampler(width, height).total == sum(1 for _ in every_grid(width, height))
+
+
+def test_samples_are_uniform():
+    grids = set(every_grid(3, 4))
+    sampler = GridSampler(3, 4)
+    draws = 200 * len(grids)
+    rng = random.Random(3)
+    seen = Counter(tuple(map(tuple, sampler.sample(rng))) for _ in range(draws))
+    assert set(seen) == grids
+    # every grid expected 200 times, this is over 7 standard deviations out
+    assert all(100 <= n <= 300 for n in seen.values())
+
+
+def test_long_boards_dont_recurse():
+    # far too little stack to recurse once per row
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(len(inspect.stack()) + 50)
+    try:
+        grid = GridSampler(1, 300).sample(random.Random(1))
+    finally:
+        sys.setrecursionlimit(limit)
+    assert len(grid) == 300 and all(len(row) == 1 for row in grid)
+    assert all(balanced(row) for row in grid) and all(balanced(column) for column in zip(*grid))
+
+
+def test_big_shapes_fall_back_to_backtracking():
+    assert sampler_fits(10, 10) and sampler_fits(16, 8)
+    for width, height in ((8, 24), (10, 30), (12, 12), (50, 50)):
+        assert not sampler_fits(width, height)
+        with pytest.raises(ValueError):
+            GridSampler(width, height)
+    generator = UrjoGenerator()
+    generator.create_full_board(30, 10, uniform=True)
+    assert all(row.check_color_count() for row in generator.board.rows)
+    assert all(column.check_color_count() for column in generator.board.columns)
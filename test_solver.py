@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+from board import Board, url_values, values_url
+from bitboard import BitBoard
+from generator import UrjoGenerator
+from solver import check_unique, find_solutions, grade_url, is_solution, propagate, solve
+
+
+@pytest.fixture(scope="module")
+def deep_puzzle():
+    """an 8x8 bitboard puzzle that needs depth 1 deductions, unique like every generated one"""
+    random.seed(5)
+    board = UrjoGenerator().create_puzzle(8, 8, contradiction_count=2, bitboard=True)
+    return board.to_url_format()
+
+
+def known_cells_match(bitboard: BitBoard, solution: BitBoard) -> bool:
+    width = bitboard.width
+    return all(not bitboard.is_known(i) or
+               (bitboard.red[i // width] >> (i % width) & 1) == (solution.red[i // width] >> (i % width) & 1)
+               for i in range(width * bitboard.height))
+
+
+def test_propagate_only_deduces_the_solution(deep_puzzle):
+    bitboard = BitBoard.from_url(deep_puzzle, 8, 8)
+    assert propagate(bitboard)
+    # hidden cells keep their solution color in the url
+    assert known_cells_match(bitboard, BitBoard.from_url(deep_puzzle, 8, 8))
+
+
+def test_propagate_finds_a_broken_line():
+    bitboard = BitBoard(4, 4)
+    for x in range(3):
+        bitboard.set_color(x, True)
+    assert not propagate(bitboard)
+
+
+def test_find_solutions_leaves_the_board_as_it_was(deep_puzzle):
+    bitboard = BitBoard.from_url(deep_puzzle, 8, 8)
+    before = bitboard.state()
+    solutions = find_solutions(bitboard, limit=2)
+    assert bitboard.state() == before
+    assert solutions == [tuple(BitBoard.from_url(deep_puzzle, 8, 8).red)]
+
+
+def test_find_solutions_stops_at_limit():
+    bitboard = BitBoard(4, 4)
+    solutions = find_solutions(bitboard, limit=3)
+    assert len(set(solutions)) == 3
+    for red in solutions:
+        solved = BitBoard(4, 4)
+        solved.load_state((0b1111,) * 4, red)
+        assert is_solution(solved)
+
+
+def test_solve_grades_a_deep_puzzle(deep_puzzle):
+    grade = grade_url(deep_puzzle, 8, 8)
+    assert grade.solved and grade.unique
+    assert grade.depth >= 1
+    assert BitBoard.from_url(grade.solution, 8, 8).red == BitBoard.from_url(deep_puzzle, 8, 8).red
+
+
+@pytest.mark.parametrize("max_steps", [1, 5, 50, 200, 1000])
+def test_running_out_of_steps_keeps_only_deductions(deep_puzzle, max_steps):
+    bitboard = BitBoard.from_url(deep_puzzle, 8, 8)
+    grade = solve(bitboard, max_steps=max_steps, count_limit=None)
+    assert not grade.solved
+    assert known_cells_match(bitboard, BitBoard.from_url(deep_puzzle, 8, 8))
+    assert grade_url(deep_puzzle, 8, 8, max_steps=max_steps).unique
+
+
+def test_check_unique_on_a_generated_puzzle(deep_puzzle):
+    assert check_unique(Board.from_url(deep_puzzle, 8, 8)) == (1, True, None)
+
+
+def test_check_unique_gives_a_counterexample(deep_puzzle):
+    # every number and color hidden, the solution colors are still in the url
+    values = bytes(value & 2 for value in url_values(deep_puzzle))
+    board = Board.from_url(values_url(values), 8, 8)
+    uniqueness = check_unique(board)
+    assert uniqueness.solutions == 2 and not uniqueness.unique
+    other = BitBoard.from_url(uniqueness.counterexample, 8, 8)
+    assert is_solution(other)
+    assert other.red != BitBoard.from_url(deep_puzzle, 8, 8).red
+
+
+def test_verify_unique_keeps_unique_puzzles():
+    random.seed(2)
+    board = UrjoGenerator().create_puzzle(6, 6, contradiction_count=1, verify_unique=True)
+    assert check_unique(board).unique
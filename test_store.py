@@ -0,0 +1,85 @@
+import os
+import random
+
+import pytest
+
+from generator import UrjoGenerator
+from store import PuzzleStore, PuzzleStoreWriter, StoredPuzzle, count_numbers, data_path, index_path, pack_url, unpack_url
+
+
+@pytest.fixture(scope="module")
+def puzzles():
+    random.seed(4)
+    generator = UrjoGenerator()
+    made = []
+    for k in range(24):
+        width, height = (6, 5) if k % 3 else (4, 4)
+        board = generator.create_puzzle(width, height, number_of_numbers=k % 4, contradiction_count=1, bitboard=True)
+        made.append(StoredPuzzle(board.to_url_format(), width, height, board.contradiction_count))
+    return made
+
+
+def write_store(base, puzzles):
+    with PuzzleStoreWriter(base) as writer:
+        for puzzle in puzzles:
+            writer.write(*puzzle)
+
+
+def by_shape(puzzles):
+    return sorted(puzzles, key=lambda puzzle: (puzzle.width, puzzle.height))
+
+
+def test_pack_url_round_trips(puzzles):
+    for puzzle in puzzles:
+        assert unpack_url(pack_url(puzzle.url), len(puzzle.url)) == puzzle.url
+
+
+def test_store_round_trip(tmp_path, puzzles):
+    base = str(tmp_path / "store")
+    write_store(base, puzzles)
+    with PuzzleStore(base) as store:
+        assert len(store) == len(puzzles)
+        # shape by shape, each in the order it was written
+        assert sorted(store, key=lambda puzzle: (puzzle.width, puzzle.height)) == by_shape(puzzles)
+        assert store.read(4, 4, 1) == [p for p in puzzles if p.width == 4][1]
+        assert sorted(store.select(width=6, numbers=range(1, 3))) == \
+            sorted(p for p in puzzles if p.width == 6 and 1 <= count_numbers(p.url) <= 2)
+        assert store.count(contradiction_count={0, 1}) == sum(p.contradiction_count <= 1 for p in puzzles)
+        sample = store.sample(5, random.Random(1), height=5)
+        assert len(set(sample)) == 5 and all(p in puzzles and p.height == 5 for p in sample)
+
+
+@pytest.mark.parametrize("damage", ["missing", "stale", "torn"])
+def test_index_is_rebuilt(tmp_path, puzzles, damage):
+    base = str(tmp_path / "store")
+    write_store(base, puzzles)
+    with PuzzleStore(base) as store:
+        keys = store.keys()
+    expected = puzzles
+    if damage == "missing":
+        os.remove(index_path(base))
+    elif damage == "stale":
+        # an index from an earlier, shorter run
+        write_store(str(tmp_path / "short"), puzzles[:5])
+        os.replace(index_path(str(tmp_path / "short")), index_path(base))
+    else:
+        # the writer died half way through a record and never wrote the index
+        os.remove(index_path(base))
+        with open(data_path(base, 6, 5), "ab") as file:
+            file.write(b"\x01\x00\x07")
+    with PuzzleStore(base) as store:
+        assert store.index_map is None
+        assert store.keys() == keys
+        assert by_shape(store) == by_shape(expected)
+        assert sorted(store.select()) == sorted(expected)
+
+
+def test_store_never_overwrites(tmp_path, puzzles):
+    base = str(tmp_path / "store")
+    write_store(base, puzzles[:2])
+    with open(index_path(base), "rb") as file:
+        index = file.read()
+    with pytest.raises(FileExistsError):
+        write_store(base, puzzles[2:4])
+    with open(index_path(base), "rb") as file:
+        assert file.read() == index
@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+from stream import PuzzleStreamWriter, part_path, part_paths, read_records
+
+RECORDS = [{"url": "ab" * k, "width": k, "height": 2, "contradiction_count": k % 3} for k in range(1, 26)]
+
+
+def test_rotates_by_records(tmp_path):
+    base = str(tmp_path / "puzzles")
+    with PuzzleStreamWriter(base, max_records=10) as writer:
+        for record in RECORDS:
+            writer.write(record)
+    assert writer.written == len(RECORDS)
+    assert part_paths(base) == [part_path(base, part) for part in range(3)]
+    assert list(read_records(base)) == RECORDS
+
+
+def test_rotates_by_bytes(tmp_path):
+    base = str(tmp_path / "puzzles")
+    with PuzzleStreamWriter(base, max_bytes=300) as writer:
+        for record in RECORDS:
+            writer.write(record)
+    paths = part_paths(base)
+    assert len(paths) > 1
+    # a part only goes over the limit when a single record is bigger than it
+    assert all(os.path.getsize(path) <= 300 for path in paths[:-1])
+    assert list(read_records(base)) == RECORDS
+
+
+def test_parts_sort_by_number_and_ignore_other_files(tmp_path):
+    base = str(tmp_path / "puzzles")
+    for part in (10, 2, 1):
+        with open(part_path(base, part), "w", encoding="utf-8") as file:
+            file.write(json.dumps({"part": part}) + "\n")
+    (tmp_path / "puzzles.notes.jsonl").write_text("{}\n")
+    assert [record["part"] for record in read_records(base)] == [1, 2, 10]
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    base = str(tmp_path / "puzzles")
+    with PuzzleStreamWriter(base) as writer:
+        for record in RECORDS[:3]:
+            writer.write(record)
+    with open(part_path(base, 0), "a", encoding="utf-8") as file:
+        file.write('{"url": "ab')
+    assert list(read_records(base)) == RECORDS[:3]
+
+
+def test_never_overwrites(tmp_path):
+    base = str(tmp_path / "puzzles")
+    PuzzleStreamWriter(base).close()
+    with pytest.raises(FileExistsError):
+        PuzzleStreamWriter(base)
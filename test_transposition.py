@@ -0,0 +1,37 @@
+import random
+
+import pytest
+
+from generator import UrjoGenerator
+from transposition import TranspositionCache
+
+# (width, height, contradiction_count, seed), small enough to keep the run short
+CASES = [(6, 6, 1, 0), (6, 6, 2, 1), (5, 7, 1, 2), (8, 8, 1, 3)]
+
+
+def generate(width, height, contradiction_count, seed, **options):
+    random.seed(seed)
+    board = UrjoGenerator().create_puzzle(width, height, contradiction_count=contradiction_count, **options)
+    return board.to_url_format(), board.contradiction_count
+
+
+@pytest.mark.parametrize("bitboard", [False, True])
+@pytest.mark.parametrize("width, height, contradiction_count, seed", CASES)
+def test_cache_gives_the_same_puzzle(bitboard, width, height, contradiction_count, seed):
+    uncached = generate(width, height, contradiction_count, seed, bitboard=bitboard, cache_size=None)
+    cached = generate(width, height, contradiction_count, seed, bitboard=bitboard, cache_size=4096)
+    # a cache too small to hold much has to give the same answers too
+    tiny = generate(width, height, contradiction_count, seed, bitboard=bitboard, cache_size=8)
+    assert cached == uncached
+    assert tiny == uncached
+
+
+def test_cache_evicts_the_least_recently_used():
+    cache = TranspositionCache(max_entries=2)
+    cache.put("a", True)
+    cache.put("b", False)
+    assert cache.get("a") is True
+    cache.put("c", True)
+    assert cache.get("b") is None
+    assert cache.get("a") is True and cache.get("c") is True
+    assert cache.stats() == {"entries": 2, "hits": 3, "misses": 1, "evictions": 1}
@@ -0,0 +1,40 @@
+from collections import OrderedDict
+from typing import Hashable
+
+
+class TranspositionCache():
+    """
+    Least recently used cache of can_be_color results, keyed by the board hash plus the hypothesis and depth.
+    Holds at most max_entries results and counts its hits, misses and evictions
+    """
+
+    def __init__(self, max_entries: int = 200_000):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[Hashable, bool] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> bool | None:
+        """Returns the stored result, None if there isnt one"""
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key: Hashable, result: bool):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drops every entry, needed whenever the numbers on the board change"""
+        self.entries.clear()
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}